@@ -1,16 +1,52 @@
-from fastapi import FastAPI, HTTPException, Depends, Query, UploadFile, File, Path
+from fastapi import FastAPI, HTTPException, Depends, Query, UploadFile, File, Path, Request, Response
 from fastapi.staticfiles import StaticFiles
-from typing import List, Optional
-from sqlalchemy import create_engine, Column, Integer, String, Date, Float
+from typing import List, Optional, Tuple
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, Date, DateTime, Float, ForeignKey, JSON, delete, func, insert, select, or_, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from pydantic import BaseModel, Field
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.routing import APIRoute
+from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime, timedelta
 from typing import List, Optional
 from datetime import date
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain, count, permutations
+from bisect import bisect_left
+from contextvars import ContextVar
+from forecast_sim import simulate_depletion_days
+from urllib.parse import parse_qsl
+import numpy as np
+import ast
+import asyncio
+import cProfile
 import csv
+import functools
+import gzip
+import heapq
+import io
+import json
 import logging
+import multiprocessing
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the standard library encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip is used when brotli is unavailable
+    brotli = None
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
@@ -47,8 +83,79 @@ class Container(Base):
     height = Column(Integer, nullable=False)
 
 
+class ItemPlacement(Base):
+    __tablename__ = "item_placements"
+    id = Column(Integer, primary_key=True, index=True)
+    item_id = Column(Integer, ForeignKey("items.id"), index=True, nullable=False)
+    container_id = Column(Integer, ForeignKey("containers.id"), index=True, nullable=False)
+    start_coordinates = Column(JSON, nullable=False)
+    end_coordinates = Column(JSON, nullable=False)
+
+
+class Log(Base):
+    __tablename__ = "logs"
+    __table_args__ = {"sqlite_autoincrement": True}  # Ids must not be reused once old rows are archived
+    id = Column(Integer, primary_key=True, index=True)
+    timestamp = Column(DateTime, index=True, nullable=False, default=datetime.now)
+    user_id = Column(String, index=True)
+    action_type = Column(String, index=True, nullable=False)
+    item_id = Column(String, index=True)  # Public itemId, kept even after the item is removed
+    container_id = Column(String, index=True)
+    details = Column(JSON)
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(String, primary_key=True)
+    kind = Column(String, index=True, nullable=False)
+    status = Column(String, index=True, nullable=False, default="queued")  # queued, running, succeeded, failed, cancelled
+    progress = Column(Float, nullable=False, default=0.0)
+    result = Column(JSON)
+    error = Column(String)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    worker_pid = Column(Integer)  # Process that owns the job, used to detect jobs orphaned by a restart
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+    updated_at = Column(DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
+
+
+class ContainerUsage(Base):
+    __tablename__ = "container_usage"
+    container_id = Column(Integer, ForeignKey("containers.id"), primary_key=True)
+    used_volume = Column(Integer, nullable=False, default=0)
+    used_mass = Column(Float, nullable=False, default=0.0)
+    item_count = Column(Integer, nullable=False, default=0)
+    surface_area = Column(Integer, nullable=False, default=0)  # Sum of placed box surface areas, for packing granularity
+
+
+class DataVersion(Base):
+    __tablename__ = "data_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class StateCheckpoint(Base):
+    __tablename__ = "state_checkpoints"
+    id = Column(Integer, primary_key=True, index=True)
+    timestamp = Column(DateTime, index=True, nullable=False, default=datetime.now)
+    last_log_id = Column(Integer, nullable=False, default=0)  # Logs up to this id are reflected in state
+    data_version = Column(Integer, nullable=False, default=0)
+    item_count = Column(Integer, nullable=False, default=0)
+    state = Column(JSON, nullable=False)  # {itemId: {usageLimit, containerId, startCoordinates, endCoordinates}}
+
+
 Base.metadata.create_all(bind=engine)
 
+# Column lists for the fast list endpoints, in the order of the response fields
+ITEM_FIELDS = ("itemId", "name", "width", "depth", "height", "mass", "priority", "expiryDate", "usageLimit", "preferredZone")
+ITEM_COLUMNS = tuple(getattr(Item, field) for field in ITEM_FIELDS)
+CONTAINER_FIELDS = ("containerId", "zone", "width", "depth", "height")
+CONTAINER_COLUMNS = tuple(getattr(Container, field) for field in CONTAINER_FIELDS)
+
+data_version_table = DataVersion.__table__
+with engine.begin() as conn:
+    for version_id in (1, 2):  # See DATA_VERSION_ROWS
+        conn.execute(sqlite_insert(data_version_table).values(id=version_id, version=0).on_conflict_do_nothing())
+
 app = FastAPI()
 
 app.add_middleware(
@@ -65,6 +172,7 @@ app.add_middleware(
 def get_db():
     db = SessionLocal()
     try:
+        refresh_data_version(db)
         yield db
     except Exception as e:
         db.rollback()  # Rollback on any exception
@@ -73,6 +181,588 @@ def get_db():
         db.close()
 
 
+# Data version: a shared counter row bumped inside every transaction that
+# changes inventory data, so every uvicorn worker on the same database can
+# tell when its in-process caches and coalesced reads have gone stale.
+# A second row, the space version, only moves when containers or placements
+# change, for caches such as the free-space index that ignore everything else.
+DATA_VERSION_ROWS = {"data": 1, "space": 2}
+_data_versions = {scope: 0 for scope in DATA_VERSION_ROWS}  # Latest versions this worker has seen
+_data_version_lock = threading.Lock()
+_cache_invalidators = {scope: [] for scope in DATA_VERSION_ROWS}
+
+# Tables whose writes do not affect cached inventory state
+DATA_VERSION_IGNORED_MODELS = (Job, Log, StateCheckpoint)
+# Tables whose writes move the space version
+SPACE_VERSION_MODELS = (Container, ItemPlacement)
+
+
+def current_data_version() -> int:
+    return _data_versions["data"]
+
+
+def register_cache_invalidator(fn, scope: str = "data"):
+    """
+    Register fn() to be called when another worker has changed the data, so
+    in-process state derived from the database can be dropped or rebuilt.
+    With scope="space" it is only called for container and placement changes.
+    """
+    _cache_invalidators[scope].append(fn)
+    return fn
+
+
+def _observe_data_version(version: int, own_write: bool = False, scope: str = "data"):
+    with _data_version_lock:
+        if version <= _data_versions[scope]:
+            return
+        # Our own commit advances the version by exactly one; callers update
+        # their in-process state for it incrementally. Any other change means
+        # a different worker (or a racing thread) wrote in between.
+        stale = not (own_write and version == _data_versions[scope] + 1)
+        _data_versions[scope] = version
+
+    if stale:
+        for invalidate in _cache_invalidators[scope]:
+            try:
+                invalidate()
+            except Exception as e:
+                logging.error(f"Cache invalidation failed: {e}", exc_info=True)
+
+
+def refresh_data_version(db: Session):
+    """
+    Cheap per-request coherence check: one primary key lookup on the shared counters.
+    """
+    rows = db.execute(
+        select(DataVersion.id, DataVersion.version).where(DataVersion.id.in_(DATA_VERSION_ROWS.values()))
+    ).all()
+    scopes = {version_id: scope for scope, version_id in DATA_VERSION_ROWS.items()}
+    for version_id, version in rows:
+        if version != _data_versions[scopes[version_id]]:
+            _observe_data_version(version, scope=scopes[version_id])
+
+
+def _touches_data(objects) -> bool:
+    return any(not isinstance(obj, DATA_VERSION_IGNORED_MODELS) for obj in objects)
+
+
+def _touches_space(objects) -> bool:
+    return any(isinstance(obj, SPACE_VERSION_MODELS) for obj in objects)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_session_written(session, flush_context):
+    changed = list(chain(session.new, session.dirty, session.deleted))
+    if _touches_data(changed):
+        session.info["wrote"] = True
+    if _touches_space(changed):
+        session.info["wrote_space"] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _mark_bulk_statement_written(orm_execute_state):
+    # Bulk insert/update/delete statements bypass the flush, so flag them here
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is None or not issubclass(mapper.class_, DATA_VERSION_IGNORED_MODELS):
+            orm_execute_state.session.info["wrote"] = True
+        if mapper is None or issubclass(mapper.class_, SPACE_VERSION_MODELS):
+            orm_execute_state.session.info["wrote_space"] = True
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _bump_data_version(session):
+    # autoflush is off, so pending changes have not been flushed yet at this point
+    pending = list(chain(session.new, session.dirty, session.deleted))
+    scopes = []
+    if session.info.get("wrote") or _touches_data(pending):
+        scopes.append("data")
+    if session.info.get("wrote_space") or _touches_space(pending):
+        scopes.append("space")
+
+    new_versions = {}
+    for scope in scopes:
+        new_versions[scope] = session.connection().execute(
+            data_version_table.update()
+            .where(data_version_table.c.id == DATA_VERSION_ROWS[scope])
+            .values(version=data_version_table.c.version + 1)
+            .returning(data_version_table.c.version)
+        ).scalar()
+    if new_versions:
+        session.info["new_versions"] = new_versions
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_data_version(session):
+    session.info.pop("wrote", None)
+    session.info.pop("wrote_space", None)
+    for scope, version in session.info.pop("new_versions", {}).items():
+        _observe_data_version(version, own_write=True, scope=scope)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _clear_session_written(session):
+    session.info.pop("wrote", None)
+    session.info.pop("wrote_space", None)
+    session.info.pop("new_versions", None)
+
+
+class _InFlightCall:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer:
+    """
+    Singleflight for read endpoints: concurrent calls with the same route,
+    normalized parameters and data version share one computation, and the
+    followers receive the leader's result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._stats = {}
+
+    def do(self, route: str, params: dict, fn):
+        normalized = tuple(sorted((name, value) for name, value in params.items() if value is not None))
+        key = (route, normalized, current_data_version())
+
+        with self._lock:
+            stats = self._stats.setdefault(route, {"executions": 0, "coalesced": 0})
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _InFlightCall()
+                stats["executions"] += 1
+            else:
+                stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            call.done.set()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "inFlight": len(self._in_flight),
+                "routes": {route: dict(stats) for route, stats in self._stats.items()}
+            }
+
+
+coalescer = RequestCoalescer()
+
+
+# Request profiling: opt-in per request with the X-Profile header, or for every
+# request via the admin toggle. Profiled requests run their endpoint under
+# cProfile (inside the threadpool thread that executes it) and record the SQL
+# they issue. Nothing below is on the request path unless profiling is active:
+# the SQL listeners are only attached while a profile is running.
+PROFILE_DIR = os.environ.get("HYPERDOCK_PROFILE_DIR", "./profiles")
+PROFILE_HEADER = b"x-profile"
+PROFILE_KEEP = 50  # Stored profiles kept on disk
+PROFILE_TOP_FUNCTIONS = 30
+
+_profiling_settings = {
+    "profileAll": os.environ.get("HYPERDOCK_PROFILE_ALL", "0") == "1",
+    "trackSlowest": os.environ.get("HYPERDOCK_TRACK_SLOWEST", "0") == "1",
+    "slowestCount": 20
+}
+_active_profile = ContextVar("active_profile", default=None)
+_slowest_requests = []  # Min-heap of (durationMs, sequence, record)
+_slowest_lock = threading.Lock()
+_slowest_sequence = count()
+_sql_listener_users = 0
+_sql_listener_lock = threading.Lock()
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, query_string: str):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.query_string = query_string
+        self.profiler = cProfile.Profile()
+        self.sql = []
+        self.sql_lock = threading.Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _active_profile.get()
+    starts = conn.info.get("profile_query_start")
+    if profile is None or not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    with profile.sql_lock:
+        profile.sql.append({
+            "statement": statement,
+            "parameters": repr(parameters)[:500],
+            "executemany": executemany,
+            "durationMs": round(elapsed * 1000, 3)
+        })
+
+
+def _attach_sql_listeners():
+    global _sql_listener_users
+    with _sql_listener_lock:
+        _sql_listener_users += 1
+        if _sql_listener_users == 1:
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _detach_sql_listeners():
+    global _sql_listener_users
+    with _sql_listener_lock:
+        _sql_listener_users -= 1
+        if _sql_listener_users == 0:
+            event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+            event.remove(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _record_request_timing(record: dict):
+    with _slowest_lock:
+        entry = (record["durationMs"], next(_slowest_sequence), record)
+        if len(_slowest_requests) < _profiling_settings["slowestCount"]:
+            heapq.heappush(_slowest_requests, entry)
+        elif entry[0] > _slowest_requests[0][0]:
+            heapq.heapreplace(_slowest_requests, entry)
+
+
+def _save_profile(profile: RequestProfile, status: Optional[int], duration_ms: float):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stats_path = os.path.join(PROFILE_DIR, f"{profile.id}.prof")
+    top_functions = ""
+    try:
+        profile.profiler.dump_stats(stats_path)
+        stream = io.StringIO()
+        pstats.Stats(profile.profiler, stream=stream).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        top_functions = stream.getvalue()
+    except TypeError:
+        # The endpoint never ran (e.g. validation failed), so there are no stats
+        stats_path = None
+
+    summary = {
+        "profileId": profile.id,
+        "timestamp": datetime.now().isoformat(),
+        "method": profile.method,
+        "path": profile.path,
+        "query": profile.query_string,
+        "status": status,
+        "durationMs": duration_ms,
+        "sqlCount": len(profile.sql),
+        "sqlDurationMs": round(sum(query["durationMs"] for query in profile.sql), 3),
+        "sql": profile.sql,
+        "hasStats": stats_path is not None,
+        "topFunctions": top_functions
+    }
+    with open(os.path.join(PROFILE_DIR, f"{profile.id}.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f)
+
+    # Keep only the most recent profiles
+    summaries = sorted(
+        (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in summaries[:-PROFILE_KEEP]:
+        for suffix in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, entry.name[:-len(".json")] + suffix))
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware so that, when profiling is off and no X-Profile header
+    is sent, a request costs one settings lookup and a header scan.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested = any(name == PROFILE_HEADER and value not in (b"", b"0") for name, value in scope["headers"])
+        profiling = requested or _profiling_settings["profileAll"]
+        if not profiling and not _profiling_settings["trackSlowest"]:
+            await self.app(scope, receive, send)
+            return
+
+        status = None
+        profile = None
+        if profiling:
+            profile = RequestProfile(scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"))
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile is not None:
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        token = None
+        if profile is not None:
+            _attach_sql_listeners()
+            token = _active_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = round((time.perf_counter() - started) * 1000, 3)
+            if profile is not None:
+                _active_profile.reset(token)
+                _detach_sql_listeners()
+                try:
+                    await run_in_threadpool(_save_profile, profile, status, duration_ms)
+                except Exception as e:
+                    logging.error(f"Failed to save profile {profile.id}: {e}", exc_info=True)
+
+            _record_request_timing({
+                "timestamp": datetime.now().isoformat(),
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status,
+                "durationMs": duration_ms,
+                "profileId": profile.id if profile is not None else None
+            })
+
+
+def _enable_profiler(profile: RequestProfile) -> bool:
+    try:
+        profile.profiler.enable()
+        return True
+    except ValueError:
+        # Newer Pythons allow a single active profiler per process; the
+        # request still gets its SQL capture and timing without call stats.
+        return False
+
+
+class ProfiledRoute(APIRoute):
+    """
+    Runs the endpoint under the request's profiler when one is active. The
+    wrapper keeps the endpoint's sync/async kind, so sync endpoints are still
+    executed in the threadpool and profiled in that thread.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        call = self.dependant.call
+
+        if asyncio.iscoroutinefunction(call):
+            @functools.wraps(call)
+            async def profiled_call(**values):
+                profile = _active_profile.get()
+                if profile is None or not _enable_profiler(profile):
+                    return await call(**values)
+                try:
+                    return await call(**values)
+                finally:
+                    profile.profiler.disable()
+        else:
+            @functools.wraps(call)
+            def profiled_call(**values):
+                profile = _active_profile.get()
+                if profile is None or not _enable_profiler(profile):
+                    return call(**values)
+                try:
+                    return call(**values)
+                finally:
+                    profile.profiler.disable()
+
+        self.dependant.call = profiled_call
+
+
+app.router.route_class = ProfiledRoute
+app.add_middleware(ProfilingMiddleware)
+
+
+# Traffic capture: with HYPERDOCK_CAPTURE_FILE set, every /api request is
+# appended to a JSONL file (method, route, query, JSON body, status, timing)
+# for replay_traffic.py. "{pid}" in the path gives each worker its own file.
+CAPTURE_FILE = os.environ.get("HYPERDOCK_CAPTURE_FILE")
+CAPTURE_SAMPLE_RATE = float(os.environ.get("HYPERDOCK_CAPTURE_SAMPLE_RATE", "1.0"))
+CAPTURE_MAX_BODY_BYTES = 64 * 1024
+CAPTURE_REDACTED_FIELDS = {"userId"}
+CAPTURE_EXCLUDED_PREFIXES = ("/api/admin",)
+
+
+def _redact(value):
+    if isinstance(value, dict):
+        return {
+            key: "redacted" if key in CAPTURE_REDACTED_FIELDS and val is not None else _redact(val)
+            for key, val in value.items()
+        }
+    if isinstance(value, list):
+        return [_redact(val) for val in value]
+    return value
+
+
+class TrafficCaptureMiddleware:
+    """
+    Pure ASGI middleware that tees the request body as the app reads it and
+    writes one sanitized trace line per request. Multipart uploads and bodies
+    over CAPTURE_MAX_BODY_BYTES are recorded without their body.
+    """
+
+    def __init__(self, app, path: str, sample_rate: float = 1.0):
+        self.app = app
+        self.path = path.format(pid=os.getpid())
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/") or \
+                scope["path"].startswith(CAPTURE_EXCLUDED_PREFIXES) or \
+                (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        body_size = 0
+        status = None
+
+        async def receive_wrapper():
+            nonlocal body_size
+            message = await receive()
+            if message["type"] == "http.request":
+                body_size += len(message.get("body", b""))
+                if body_size <= CAPTURE_MAX_BODY_BYTES:
+                    chunks.append(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        timestamp = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            duration_ms = round((time.perf_counter() - started) * 1000, 3)
+            try:
+                self._write(scope, timestamp, b"".join(chunks), body_size, status, duration_ms)
+            except Exception as e:
+                logging.error(f"Failed to capture request trace: {e}", exc_info=True)
+
+    def _write(self, scope, timestamp: float, body: bytes, body_size: int, status: Optional[int], duration_ms: float):
+        headers = dict(scope["headers"])
+        content_type = headers.get(b"content-type", b"").decode("latin-1")
+        route = scope.get("route")
+        query = [
+            [key, "redacted" if key in CAPTURE_REDACTED_FIELDS else value]
+            for key, value in parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+        ]
+
+        trace = {
+            "ts": timestamp,
+            "method": scope["method"],
+            "route": route.path if route is not None else scope["path"],
+            "path": scope["path"],
+            "query": query,
+            "status": status,
+            "durationMs": duration_ms
+        }
+        if body_size:
+            if content_type.startswith("multipart/"):
+                trace["bodyOmitted"] = "multipart"
+            elif body_size > CAPTURE_MAX_BODY_BYTES:
+                trace["bodyOmitted"] = "too large"
+            else:
+                try:
+                    trace["body"] = _redact(json.loads(body))
+                except ValueError:
+                    trace["bodyOmitted"] = "not json"
+        if headers.get(b"accept-encoding"):
+            trace["acceptEncoding"] = headers[b"accept-encoding"].decode("latin-1")
+
+        line = json.dumps(trace, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+
+if CAPTURE_FILE:
+    app.add_middleware(TrafficCaptureMiddleware, path=CAPTURE_FILE, sample_rate=CAPTURE_SAMPLE_RATE)
+
+
+# Fast JSON responses for large lists: endpoints build plain dicts from column
+# tuples, encode them once with orjson (when installed) and compress the body
+# with brotli or gzip when the client accepts it.
+COMPRESSION_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_json(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+
+def _accepted_encodings(request: Request) -> set:
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        encoding, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(encoding.strip().lower())
+    return accepted
+
+
+def fast_json_response(request: Request, body: bytes, status_code: int = 200) -> Response:
+    """
+    Wrap an already encoded JSON body, negotiating brotli/gzip compression.
+    """
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= COMPRESSION_MIN_BYTES:
+        accepted = _accepted_encodings(request)
+        if brotli is not None and "br" in accepted:
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accepted:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
+
+
 @app.get("/")
 def home():
     return {"message": "Space Cargo API is running!", "frontend": "/static/index.html"}
@@ -157,6 +847,12 @@ class WasteReturnPlanResponse(BaseModel):
 class CompleteUndockingRequest(BaseModel):
     undockingContainerId: str = Field(..., example="container001")
     timestamp: Optional[str] = Field(None, example="2025-04-02T12:00:00")
+    userId: Optional[str] = Field(None, example="astronaut1")
+
+
+class CompleteUndockingResponse(BaseModel):
+    success: bool
+    itemsRemoved: int = Field(..., example=5)
 
 
 class ApiResponse(BaseModel):
@@ -175,6 +871,31 @@ class TimeSimulationResponse(BaseModel):
     changes: dict = Field(..., example={"itemsUsed": [{"itemId": "item002", "name": "Test Item", "remainingUses": 49}], "itemsExpired": [], "itemsDepletedToday": []})
 
 
+class ConsumptionForecastRequest(BaseModel):
+    numTrajectories: int = Field(10000, example=10000)
+    horizonDays: int = Field(180, example=180)
+    defaultUsesPerDay: float = Field(0.0, example=0.5)
+    usageRates: List[dict] = Field(default_factory=list, example=[{"itemId": "item002", "usesPerDay": 1.5}])
+    itemIds: Optional[List[str]] = Field(None, example=["item002"])
+    quantiles: List[float] = Field([0.05, 0.5, 0.95], example=[0.05, 0.5, 0.95])
+    seed: Optional[int] = Field(None, example=42)
+
+
+class ConsumptionForecastResponse(BaseModel):
+    success: bool
+    startDate: str = Field(..., example="2025-04-01")
+    horizonDays: int = Field(..., example=180)
+    numTrajectories: int = Field(..., example=10000)
+    forecasts: List[dict] = Field(..., example=[{
+        "itemId": "item002",
+        "name": "Test Item",
+        "remainingUses": 49,
+        "expiryDate": None,
+        "probabilityDepleted": 0.97,
+        "depletionDates": {"p5": "2025-04-28", "p50": "2025-05-03", "p95": "2025-05-09"}
+    }])
+
+
 class ImportResponse(BaseModel):
     success: bool
     itemsImported: int = Field(..., example=10)
@@ -183,6 +904,36 @@ class ImportResponse(BaseModel):
         example=[{"row": {"itemId": "bad_id"}, "message": "Invalid data"}]
     )
 
+class BatchPlacementRequest(BaseModel):
+    userId: Optional[str] = Field(None, example="astronaut1")
+    timestamp: Optional[str] = Field(None, example="2025-03-15T10:00:00")
+    placements: List[dict] = Field(..., example=[{
+        "itemId": "item001",
+        "containerId": "container001",
+        "position": {
+            "startCoordinates": {"width": 0, "depth": 0, "height": 0},
+            "endCoordinates": {"width": 10, "depth": 10, "height": 20}
+        }
+    }])
+
+
+class BatchPlacementResponse(BaseModel):
+    success: bool
+    placed: int = Field(..., example=1)
+    failed: int = Field(..., example=0)
+    results: List[dict] = Field(..., example=[{"itemId": "item001", "containerId": "container001", "success": True}])
+
+
+class ArrangementImportResponse(BaseModel):
+    success: bool
+    placementsImported: int = Field(..., example=10)
+    rowsSkipped: int = Field(..., example=0)
+    errors: List[dict] = Field(
+        default_factory=list,
+        example=[{"row": 3, "itemId": "item002", "message": "Overlaps with item item001"}]
+    )
+
+
 class ConfirmPlacementRequest(BaseModel):
     itemId: str = Field(..., example="item001")
     containerId: str = Field(..., example="container001")
@@ -197,6 +948,12 @@ class ConfirmPlacementRequest(BaseModel):
     timestamp: str = Field(..., example="2025-03-15T10:00:00")
 
 
+class ProfilingSettingsRequest(BaseModel):
+    profileAll: Optional[bool] = Field(None, example=False)
+    trackSlowest: Optional[bool] = Field(None, example=True)
+    slowestCount: Optional[int] = Field(None, example=20)
+
+
 class LogEntry(BaseModel):
     timestamp: str = Field(..., example="2025-03-13T10:00:00")
     userId: str = Field(..., example="astronaut1")
@@ -207,6 +964,7 @@ class LogEntry(BaseModel):
 
 from fastapi import HTTPException
 from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
 
 @app.post("/api/containers")
 def add_containers(containers: List[ContainerSchema], db: Session = Depends(get_db)):
@@ -230,6 +988,7 @@ def add_containers(containers: List[ContainerSchema], db: Session = Depends(get_
             added_containers.append(container.containerId)
 
         db.commit()
+        space_index.invalidate()
 
         return {
             "success": True,
@@ -257,6 +1016,7 @@ def add_containers(containers: List[ContainerSchema], db: Session = Depends(get_
             for item in items:
                 db_item = Item(**item.dict())
                 db.add(db_item)
+                log_item_creation(db, db_item)
                 added_items.append(item.itemId)
 
             db.commit()
@@ -283,15 +1043,15 @@ def add_containers(containers: List[ContainerSchema], db: Session = Depends(get_
 
 # API: Get All Containers
 @app.get("/api/containers")
-def get_containers(db: Session = Depends(get_db)):
+def get_containers(request: Request, db: Session = Depends(get_db)):
     try:
-        containers = db.query(Container).all()
-        container_data = [ContainerSchema.model_validate(c).dict() for c in containers]
+        rows = db.execute(select(*CONTAINER_COLUMNS)).all()
+        container_data = [dict(zip(CONTAINER_FIELDS, row)) for row in rows]
 
-        return {
+        return fast_json_response(request, dumps_json({
             "success": True,
             "containers": container_data
-        }
+        }))
 
     except Exception as e:
         logging.error(f"Error getting containers: {e}")
@@ -315,8 +1075,12 @@ async def delete_item(item_id: str, db: Session = Depends(get_db)):
                 "message": f"Item with ID '{item_id}' not found"
             }
 
+        placement = remove_item_placement(db, item)
         db.delete(item)
+        db.add(Log(action_type="deletion", item_id=item_id, details={}))
         db.commit()
+        if placement:
+            space_index.mark_dirty(placement.container_id)
         return {
             "success": True,
             "message": f"Item with ID '{item_id}' deleted successfully"
@@ -340,13 +1104,28 @@ def delete_container(container_id: str, db: Session = Depends(get_db)):
                 "message": f"Container with ID '{container_id}' not found"
             }
 
+        # Container ids are reused by SQLite, so placements left behind would
+        # silently move into the next container created
+        placed = db.execute(
+            select(func.count(ItemPlacement.id)).where(ItemPlacement.container_id == db_container.id)
+        ).scalar()
+        if placed:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Container with ID '{container_id}' still holds {placed} item(s); retrieve or move them first"
+            )
+
+        db.execute(delete(ContainerUsage).where(ContainerUsage.container_id == db_container.id))
         db.delete(db_container)
         db.commit()
+        space_index.invalidate()
         return {
             "success": True,
             "message": f"Container with ID '{container_id}' deleted successfully"
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         logging.error(f"Error deleting container '{container_id}': {e}")
@@ -355,16 +1134,22 @@ def delete_container(container_id: str, db: Session = Depends(get_db)):
             "message": f"Failed to delete container '{container_id}' due to internal error"
         }
 
+def list_items(db: Session) -> dict:
+    rows = db.execute(select(*ITEM_COLUMNS)).all()
+    item_list = [dict(zip(ITEM_FIELDS, row)) for row in rows]
+    return {
+        "success": True,
+        "items": item_list,
+        "total": len(item_list)
+    }
+
+
 @app.get("/api/items")
-def get_items(db: Session = Depends(get_db)):
+def get_items(request: Request, db: Session = Depends(get_db)):
     try:
-        items = db.query(Item).all()
-        item_list = [ItemSchema.model_validate(item).model_dump() for item in items]
-        return {
-            "success": True,
-            "items": item_list,
-            "total": len(item_list)
-        }
+        # Coalesced callers share the encoded body, so it is serialized only once
+        body = coalescer.do("/api/items", {}, lambda: dumps_json(list_items(db)))
+        return fast_json_response(request, body)
     except Exception as e:
         logging.error(f"Error getting items: {e}")
         return {
@@ -388,13 +1173,17 @@ def get_item(item_id: str, db: Session = Depends(get_db)):
         logging.error(f"Error getting item: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@app.post("/api/placement", response_model=PlacementResponse)
-def calculate_placement_recommendations(req: PlacementRequest, db: Session = Depends(get_db)):
+def recommend_placements(db: Session, req: PlacementRequest, progress=None) -> PlacementResponse:
+    """
+    Recommend a position for each requested item.
+    """
     try:
         if not req.items:
             raise HTTPException(status_code=400, detail="Item data is required.")
 
         item = req.items[0]  # Assuming single item for simplicity
+        if progress:
+            progress(0, 1)
         db_item = db.query(Item).filter(Item.itemId == item.itemId).first()
         if not db_item:
             raise HTTPException(status_code=404, detail=f"Item with ID '{item.itemId}' not found.")
@@ -420,12 +1209,17 @@ def calculate_placement_recommendations(req: PlacementRequest, db: Session = Dep
             }
         }
 
+        if progress:
+            progress(1, 1)
+
         return PlacementResponse(
             success=True,
             placements=[placement],
             rearrangements=[]
         )
 
+    except JobCancelled:
+        raise
     except HTTPException as http_exc:
         return PlacementResponse(
             success=True,
@@ -440,6 +1234,16 @@ def calculate_placement_recommendations(req: PlacementRequest, db: Session = Dep
             rearrangements=[]
         )
 
+@app.post("/api/placement", response_model=PlacementResponse)
+def calculate_placement_recommendations(
+    req: PlacementRequest,
+    async_mode: bool = Query(False, alias="async"),
+    db: Session = Depends(get_db)
+):
+    if async_mode:
+        return job_submitted_response(submit_job("placement", recommend_placements, req))
+    return recommend_placements(db, req)
+
 @app.post("/api/place", response_model=ApiResponse)
 def confirm_placement(req: ConfirmPlacementRequest, db: Session = Depends(get_db)):
     try:
@@ -471,14 +1275,26 @@ def confirm_placement(req: ConfirmPlacementRequest, db: Session = Depends(get_db
         if not is_valid_position(req.position, container):
             raise HTTPException(status_code=400, detail="Invalid position within container")
 
-        # Record placement
-        item_placement = ItemPlacement(
-            item_id=item.id,
-            container_id=container.id,
-            start_coordinates=start,
-            end_coordinates=end
-        )
-        db.add(item_placement)
+        # Record placement, moving the item if it is already placed somewhere
+        item_placement = db.query(ItemPlacement).filter(ItemPlacement.item_id == item.id).first()
+        previous_container_pk = item_placement.container_id if item_placement else None
+        if item_placement:
+            adjust_container_usage(
+                db, item_placement.container_id,
+                item_placement.start_coordinates, item_placement.end_coordinates, item.mass, sign=-1
+            )
+            item_placement.container_id = container.id
+            item_placement.start_coordinates = start
+            item_placement.end_coordinates = end
+        else:
+            item_placement = ItemPlacement(
+                item_id=item.id,
+                container_id=container.id,
+                start_coordinates=start,
+                end_coordinates=end
+            )
+            db.add(item_placement)
+        adjust_container_usage(db, container.id, start, end, item.mass)
 
         # Create log
         create_log_entry(
@@ -491,6 +1307,10 @@ def confirm_placement(req: ConfirmPlacementRequest, db: Session = Depends(get_db
         )
 
         db.commit()
+
+        if previous_container_pk is not None:
+            space_index.mark_dirty(previous_container_pk)
+        space_index.add_placement(container.id, start, end)
         return {"success": True}
 
     except HTTPException as e:
@@ -503,6 +1323,51 @@ def confirm_placement(req: ConfirmPlacementRequest, db: Session = Depends(get_db
         raise HTTPException(status_code=500, detail="Failed to confirm placement")
 
 
+# API: Confirm Batch Placement
+@app.post("/api/place/batch", response_model=BatchPlacementResponse)
+def confirm_batch_placement(req: BatchPlacementRequest, db: Session = Depends(get_db)):
+    try:
+        logging.info(f"Batch placement request received: {len(req.placements)} placements from {req.userId}")
+
+        results = [None] * len(req.placements)
+        entries = []
+        positions = []
+        for index, placement in enumerate(req.placements):
+            # Ids are used as set and dict keys in bulk_place, so reject anything but strings here
+            if not (
+                isinstance(placement.get("itemId"), str) and placement["itemId"]
+                and isinstance(placement.get("containerId"), str) and placement["containerId"]
+                and isinstance(placement.get("position"), dict)
+            ):
+                results[index] = {
+                    "itemId": placement.get("itemId"),
+                    "success": False,
+                    "message": "Missing or invalid placement fields."
+                }
+                continue
+            entries.append(placement)
+            positions.append(index)
+
+        for index, result in zip(positions, bulk_place(db, entries, user_id=req.userId, timestamp=req.timestamp) if entries else []):
+            results[index] = result
+
+        for placement, result in zip(req.placements, results):
+            result["containerId"] = placement.get("containerId")
+
+        placed = sum(1 for result in results if result["success"])
+        return {
+            "success": placed == len(results),
+            "placed": placed,
+            "failed": len(results) - placed,
+            "results": results
+        }
+
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error confirming batch placement: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to confirm batch placement")
+
+
 def is_valid_position(position: dict, container: Container) -> bool:
     """
     Helper function to validate if the given position is within the container's bounds.
@@ -525,6 +1390,14 @@ def is_valid_position(position: dict, container: Container) -> bool:
     return True
 
 
+def log_item_creation(db: Session, item: Item, user_id: str = None):
+    """
+    Stage a "creation" log row for a newly added item, to be committed with it.
+    """
+    db.flush()  # Apply column defaults so the log records the stored usageLimit
+    db.add(Log(user_id=user_id, action_type="creation", item_id=item.itemId, details={"usageLimit": item.usageLimit}))
+
+
 def create_log_entry(
     db: Session,
     user_id: str,
@@ -554,147 +1427,940 @@ def create_log_entry(
         return None
 
 
-# API: Item Search and Retrieval
-@app.get("/api/search", response_model=SearchResponse)
-def search_item(
-    itemId: Optional[str] = Query(None),
-    itemName: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
-):
-    try:
-        if not itemId and not itemName:
-            raise HTTPException(status_code=400, detail="Either itemId or itemName must be provided")
-
-        query = db.query(Item)
-        item = query.filter(Item.itemId == itemId).first() if itemId else query.filter(Item.name == itemName).first()
-
-        if not item:
-            return {
-                "success": True,
-                "found": False,
-                "item": None,
-                "retrievalSteps": []
-            }
-
-        return {
-            "success": True,
-            "found": True,
-            "item": {
-                "itemId": item.itemId,
-                "name": item.name,
-                "containerId": "contA",  # Placeholder
-                "zone": item.preferredZone,
-                "position": {
-                    "startCoordinates": {"width": 0, "depth": 0, "height": 0},
-                    "endCoordinates": {"width": item.width, "depth": item.depth, "height": item.height}
-                }
-            },
-            "retrievalSteps": [
-                {"step": 1, "action": "retrieve", "itemId": item.itemId, "itemName": item.name}
-            ]
-        }
+# Storage utilization counters: one container_usage row per container, updated
+# in the same transaction as every placement change so analytics never have to
+# scan items or placements.
+def _box_metrics(start: dict, end: dict):
+    """
+    Volume and surface area of the axis-aligned box between two corner coordinates.
+    """
+    width = end["width"] - start["width"]
+    depth = end["depth"] - start["depth"]
+    height = end["height"] - start["height"]
+    return width * depth * height, 2 * (width * depth + width * height + depth * height)
 
-    except HTTPException as e:
-        raise e  # Keep standard FastAPI behavior for expected errors
-    except Exception as e:
-        logging.error(f"Error searching item: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Internal server error")
 
+def adjust_container_usage(db: Session, container_pk: int, start: dict, end: dict, mass: float, sign: int = 1):
+    """
+    Add (sign=1) or remove (sign=-1) one placed box from a container's counters.
+    """
+    volume, surface = _box_metrics(start, end)
+    _upsert_container_usage(db, container_pk, sign * volume, sign * (mass or 0.0), sign, sign * surface)
 
-# API: Retrieve Item
-@app.post("/api/retrieve", response_model=ApiResponse)
-def retrieve_item(req: RetrieveRequest, db: Session = Depends(get_db)):
-    try:
-        logging.info(f"Retrieve request received: {req}")
 
-        item = db.query(Item).filter(Item.itemId == req.itemId).first()
-        if not item:
-            raise HTTPException(status_code=404, detail=f"Item with ID {req.itemId} not found")
+def _upsert_container_usage(db: Session, container_pk: int, volume: int, mass: float, item_delta: int, surface: int):
+    stmt = sqlite_insert(ContainerUsage).values(
+        container_id=container_pk,
+        used_volume=volume,
+        used_mass=mass,
+        item_count=item_delta,
+        surface_area=surface
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[ContainerUsage.container_id],
+        set_={
+            "used_volume": ContainerUsage.used_volume + stmt.excluded.used_volume,
+            "used_mass": ContainerUsage.used_mass + stmt.excluded.used_mass,
+            "item_count": ContainerUsage.item_count + stmt.excluded.item_count,
+            "surface_area": ContainerUsage.surface_area + stmt.excluded.surface_area
+        }
+    ))
 
-        # 1. Update usageLimit if applicable and not None
-        if item.usageLimit is not None and item.usageLimit > 0:
-            item.usageLimit -= 1
-            db.commit()
-            logging.info(f"Usage limit decremented for item {req.itemId}. New usageLimit: {item.usageLimit}")
-        else:
-            logging.info(f"No usage limit update needed for item {req.itemId} (usageLimit={item.usageLimit})")
 
-        # 2. Create a log entry
-        create_log_entry(
-            db,
-            user_id=req.userId,
-            action_type="retrieval",
-            item_id=req.itemId,
-            details={"timestamp": req.timestamp}
+def remove_item_placement(db: Session, item: Item) -> Optional[ItemPlacement]:
+    """
+    Take an item out of its container, if it is placed, keeping the counters in step.
+    """
+    placement = db.query(ItemPlacement).filter(ItemPlacement.item_id == item.id).first()
+    if placement:
+        adjust_container_usage(
+            db, placement.container_id, placement.start_coordinates, placement.end_coordinates, item.mass, sign=-1
         )
-        logging.info(f"Log entry created for item {req.itemId} retrieval")
+        db.delete(placement)
+    return placement
 
-        return {"success": True}
 
-    except HTTPException as e:
-        db.rollback()
-        raise e
+def rebuild_container_usage(db: Session) -> int:
+    """
+    Recompute every container's counters from the placements table.
+    """
+    totals = {}
+    rows = (
+        db.query(ItemPlacement.container_id, ItemPlacement.start_coordinates, ItemPlacement.end_coordinates, Item.mass)
+        .join(Item, Item.id == ItemPlacement.item_id)
+        .all()
+    )
+    for container_pk, start, end, mass in rows:
+        volume, surface = _box_metrics(start, end)
+        usage = totals.setdefault(container_pk, {
+            "container_id": container_pk, "used_volume": 0, "used_mass": 0.0, "item_count": 0, "surface_area": 0
+        })
+        usage["used_volume"] += volume
+        usage["used_mass"] += mass or 0.0
+        usage["item_count"] += 1
+        usage["surface_area"] += surface
+
+    db.execute(delete(ContainerUsage))
+    if totals:
+        db.execute(insert(ContainerUsage), list(totals.values()))
+    db.commit()
+    return len(rows)
+
+
+def _rebuild_container_usage_if_missing():
+    # Databases created before the counters existed get them computed once
+    db = SessionLocal()
+    try:
+        if db.query(ContainerUsage).first() is None and db.query(ItemPlacement).first() is not None:
+            placed = rebuild_container_usage(db)
+            logging.info(f"Rebuilt container usage counters from {placed} placements")
     except Exception as e:
         db.rollback()
-        logging.error(f"Error retrieving item: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Failed to retrieve item")
-
+        logging.error(f"Failed to rebuild container usage counters: {e}", exc_info=True)
+    finally:
+        db.close()
 
-# API: Identify Waste Items
-@app.get("/api/waste/identify", response_model=WasteIdentifyResponse)
-def identify_waste_items(db: Session = Depends(get_db)):
-    try:
-        today = datetime.now().date()
-        waste_items = []
-        items = db.query(Item).all()
 
-        for item in items:
-            reason = None
+_rebuild_container_usage_if_missing()
 
-            # Handle expiry date
-            if item.expiryDate and item.expiryDate < today:
-                reason = "Expired"
 
-            # Handle usage limit only if not None
-            elif item.usageLimit is not None and item.usageLimit == 0:
-                reason = "Out of Uses"
+def _packing_granularity(volume: float, surface: float) -> float:
+    """
+    How finely the used volume is divided into boxes: 0 when it is a single
+    cube, approaching 1 as the same volume is split into many small or thin
+    boxes. It compares surface area with volume only, so it says nothing about
+    how the free space is laid out (a container packed solid with unit cubes
+    scores high); /api/space/find answers that from the free-space index.
+    """
+    if volume <= 0 or surface <= 0:
+        return 0.0
+    return round(max(0.0, 1 - 6 * volume ** (2 / 3) / surface), 4)
+
+
+def _utilization_summary(capacity: int, volume: int, mass: float, count: int, surface: int) -> dict:
+    return {
+        "capacityVolume": capacity,
+        "usedVolume": volume,
+        "freeVolume": capacity - volume,
+        "utilization": round(volume / capacity, 4) if capacity else 0.0,
+        "usedMass": round(mass, 4),
+        "itemCount": count,
+        "packingGranularity": _packing_granularity(volume, surface)
+    }
+
+
+# API: Storage Utilization
+@app.get("/api/analytics/utilization")
+def get_utilization(zone: Optional[str] = Query(None, example="ZoneA"), db: Session = Depends(get_db)):
+    try:
+        query = db.query(
+            Container.containerId, Container.zone, Container.width, Container.depth, Container.height,
+            ContainerUsage.used_volume, ContainerUsage.used_mass, ContainerUsage.item_count, ContainerUsage.surface_area
+        ).outerjoin(ContainerUsage, ContainerUsage.container_id == Container.id)
+        if zone:
+            query = query.filter(Container.zone == zone)
+
+        containers = []
+        zones = {}
+        station = [0, 0, 0.0, 0, 0]
+        for row in query.order_by(Container.zone, Container.containerId).all():
+            totals = (
+                row.width * row.depth * row.height,
+                row.used_volume or 0,
+                row.used_mass or 0.0,
+                row.item_count or 0,
+                row.surface_area or 0
+            )
+            containers.append({"containerId": row.containerId, "zone": row.zone, **_utilization_summary(*totals)})
 
-            if reason:
-                waste_items.append({
-                    "itemId": item.itemId,
-                    "name": item.name,
-                    "reason": reason,
-                    "containerId": "contA",  # Placeholder
-                    "position": {
-                        "startCoordinates": {"width": 0, "depth": 0, "height": 0},
-                        "endCoordinates": {
-                            "width": item.width,
-                            "depth": item.depth,
-                            "height": item.height
-                        }
-                    }
-                })
+            zone_totals = zones.setdefault(row.zone, [0, 0, 0.0, 0, 0])
+            for index, value in enumerate(totals):
+                zone_totals[index] += value
+                station[index] += value
 
         return {
             "success": True,
-            "wasteItems": waste_items
+            "containers": containers,
+            "zones": [{"zone": name, **_utilization_summary(*totals)} for name, totals in zones.items()],
+            "station": _utilization_summary(*station)
         }
 
     except Exception as e:
-        logging.error(f"Error identifying waste: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Failed to identify waste items")
+        logging.error(f"Error getting utilization: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to compute storage utilization")
 
 
-# API: Generate Waste Return Plan
-@app.post("/api/waste/return-plan", response_model=WasteReturnPlanResponse)
-def generate_waste_return_plan(req: WasteReturnPlanRequest, db: Session = Depends(get_db)):
+# API: Rebuild Utilization Counters
+@app.post("/api/analytics/utilization/rebuild")
+def rebuild_utilization(db: Session = Depends(get_db)):
     try:
-        return_plan = []
-        retrieval_steps = []
-        return_manifest = {
-            "undockingContainerId": req.undockingContainerId,
-            "undockingDate": req.undockingDate,
-            "returnItems": [],
+        placed = rebuild_container_usage(db)
+        return {"success": True, "placementsCounted": placed}
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error rebuilding utilization counters: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to rebuild utilization counters")
+
+
+# Free space index: each container's empty space is kept as a set of maximal
+# empty cuboids (the largest axis-aligned boxes that touch no placed item).
+# Placements carve the cuboids incrementally; removals mark the container for a
+# rebuild from its own placements on the next query.
+FREE_SPACE_GRID_CELLS = 8  # Grid cells per container axis for the cuboid spatial index
+
+
+def _cuboid_contains(outer: tuple, inner: tuple) -> bool:
+    return (
+        outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] <= inner[2] and
+        outer[3] >= inner[3] and outer[4] >= inner[4] and outer[5] >= inner[5]
+    )
+
+
+def _split_around(cuboid: tuple, box: tuple) -> List[tuple]:
+    """
+    The up to six slabs of cuboid that lie on each side of an intersecting box,
+    each paired with the face key of the box plane it touches (see
+    _ContainerSpace.faces).
+    """
+    x1, y1, z1, x2, y2, z2 = cuboid
+    bx1, by1, bz1, bx2, by2, bz2 = box
+    slabs = []
+    if bx1 > x1:
+        slabs.append(((0, True, bx1), (x1, y1, z1, bx1, y2, z2)))
+    if bx2 < x2:
+        slabs.append(((0, False, bx2), (bx2, y1, z1, x2, y2, z2)))
+    if by1 > y1:
+        slabs.append(((1, True, by1), (x1, y1, z1, x2, by1, z2)))
+    if by2 < y2:
+        slabs.append(((1, False, by2), (x1, by2, z1, x2, y2, z2)))
+    if bz1 > z1:
+        slabs.append(((2, True, bz1), (x1, y1, z1, x2, y2, bz1)))
+    if bz2 < z2:
+        slabs.append(((2, False, bz2), (x1, y1, bz2, x2, y2, z2)))
+    return slabs
+
+
+def _cuboid_volume(cuboid: tuple):
+    return (cuboid[3] - cuboid[0]) * (cuboid[4] - cuboid[1]) * (cuboid[5] - cuboid[2])
+
+
+class _ContainerSpace:
+    """
+    Maximal free cuboids of one container, registered in a uniform grid of
+    cells so that carving a box only visits the cuboids in the cells around
+    it instead of every cuboid in the container. Guarded by its own lock.
+    """
+
+    __slots__ = ("containerId", "zone", "lock", "cuboids", "cells", "cell_size", "grid_size", "_ids",
+                 "by_volume", "volumes", "max_sorted_dims")
+
+    def __init__(self, containerId: str, zone: str, width: int, depth: int, height: int):
+        self.containerId = containerId
+        self.zone = zone
+        self.lock = threading.Lock()
+        self.cuboids = {}  # id -> cuboid
+        self.cells = {}  # (i, j, k) -> ids of cuboids overlapping that cell
+        self.grid_size = tuple(max(1, min(FREE_SPACE_GRID_CELLS, int(size))) for size in (width, depth, height))
+        self.cell_size = tuple(max(size, 1) / cells for size, cells in zip((width, depth, height), self.grid_size))
+        self._ids = count()
+        self.by_volume = None
+        self.volumes = None
+        self.max_sorted_dims = None
+        if width > 0 and depth > 0 and height > 0:
+            self._add((0, 0, 0, width, depth, height))
+
+    def _cells(self, box: tuple):
+        ranges = []
+        for axis in range(3):
+            size, cells = self.cell_size[axis], self.grid_size[axis]
+            first = max(0, int(box[axis] // size))
+            last = min(cells, -int(-box[axis + 3] // size))  # Exclusive, ceil of the upper bound
+            if first >= last:
+                return
+            ranges.append(range(first, last))
+        for i in ranges[0]:
+            for j in ranges[1]:
+                for k in ranges[2]:
+                    yield (i, j, k)
+
+    def _add(self, cuboid: tuple):
+        cuboid_id = next(self._ids)
+        self.cuboids[cuboid_id] = cuboid
+        for cell in self._cells(cuboid):
+            self.cells.setdefault(cell, set()).add(cuboid_id)
+
+    def _remove(self, cuboid_id: int):
+        cuboid = self.cuboids.pop(cuboid_id)
+        for cell in self._cells(cuboid):
+            ids = self.cells.get(cell)
+            if ids is not None:
+                ids.discard(cuboid_id)
+                if not ids:
+                    del self.cells[cell]
+
+    def carve(self, box: tuple):
+        """
+        Remove an occupied box. Every cuboid it intersects is split into slabs
+        around the box, and slabs contained in another cuboid are dropped so
+        the set stays maximal.
+
+        Only the new slabs can be non-maximal: an untouched cuboid cannot sit
+        inside a slab cut from a different maximal cuboid. A slab touching the
+        box's low-x face can only be contained in another slab on that side or
+        in an untouched cuboid that touches the same face from outside (its
+        high-x face on that plane; any other would overlap the box), and
+        likewise for the other five faces. Those neighbours all lie in the
+        cells one step around the box.
+        """
+        bx1, by1, bz1, bx2, by2, bz2 = box
+        cx, cy, cz = self.cell_size
+        nearby = set()
+        for cell in self._cells((bx1 - cx, by1 - cy, bz1 - cz, bx2 + cx, by2 + cy, bz2 + cz)):
+            nearby.update(self.cells.get(cell, ()))
+
+        hit = []
+        touching = {}  # face key -> untouched cuboids against that face of the box
+        for cuboid_id in nearby:
+            cuboid = self.cuboids[cuboid_id]
+            x1, y1, z1, x2, y2, z2 = cuboid
+            overlaps = (bx1 < x2 and bx2 > x1, by1 < y2 and by2 > y1, bz1 < z2 and bz2 > z1)
+            if all(overlaps):
+                hit.append(cuboid_id)
+                continue
+            for axis in range(3):
+                if overlaps[axis - 1] and overlaps[axis - 2]:
+                    if cuboid[axis + 3] == box[axis]:
+                        touching.setdefault((axis, True, box[axis]), []).append(cuboid)
+                    elif cuboid[axis] == box[axis + 3]:
+                        touching.setdefault((axis, False, box[axis + 3]), []).append(cuboid)
+        if not hit:
+            return
+
+        sides = {}  # face key -> new slabs touching that box face
+        for cuboid_id in hit:
+            for key, slab in _split_around(self.cuboids[cuboid_id], box):
+                sides.setdefault(key, set()).add(slab)
+            self._remove(cuboid_id)
+
+        for key, slabs in sides.items():
+            neighbours = touching.get(key, ())
+            kept = []
+            # Largest first: a slab contained in a dropped slab is also contained
+            # in whatever dropped that one, so comparing with kept slabs is enough.
+            for slab in sorted(slabs, key=_cuboid_volume, reverse=True):
+                if any(_cuboid_contains(other, slab) for other in neighbours) or \
+                        any(_cuboid_contains(other, slab) for other in kept):
+                    continue
+                kept.append(slab)
+            for slab in kept:
+                self._add(slab)
+
+        self.by_volume = None
+        self.volumes = None
+        self.max_sorted_dims = None
+
+    def summary(self):
+        """
+        Cuboids sorted by ascending volume (with their volumes for bisection),
+        plus the componentwise maximum of their sorted dimensions: a box whose
+        sorted dimensions exceed it fits nowhere in this container. The lists
+        are rebuilt, never mutated, after a carve; call with the lock held.
+        """
+        if self.by_volume is None:
+            self.by_volume = sorted((_cuboid_volume(c), c) for c in self.cuboids.values())
+            self.volumes = [volume for volume, _ in self.by_volume]
+            max_dims = [0, 0, 0]
+            for c in self.cuboids.values():
+                for axis, size in enumerate(sorted((c[3] - c[0], c[4] - c[1], c[5] - c[2]))):
+                    max_dims[axis] = max(max_dims[axis], size)
+            self.max_sorted_dims = tuple(max_dims)
+        return self.by_volume, self.volumes, self.max_sorted_dims
+
+
+class FreeSpaceIndex:
+    """
+    Per-worker free space index, loaded lazily from the database and dropped
+    whenever another worker changes containers or placements (see
+    register_cache_invalidator).
+
+    The state lock only guards the container map and its bookkeeping.
+    Rebuilds read the database and carve under a separate build lock, so
+    placements and invalidations never wait for them. Each container carves
+    under its own lock. Every change bumps the container's stamp. A rebuilt
+    container is installed only if its stamp did not move while it was
+    loading; otherwise it stays dirty and is rebuilt on the next query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._containers = None  # container pk -> _ContainerSpace
+        self._dirty = set()
+        self._stamps = {}  # container pk -> change counter
+        self._generation = 0  # Bumped by invalidate()
+
+    def _bump(self, container_pk: int):
+        self._stamps[container_pk] = self._stamps.get(container_pk, 0) + 1
+
+    def invalidate(self):
+        with self._lock:
+            self._containers = None
+            self._dirty.clear()
+            self._generation += 1
+
+    def mark_dirty(self, container_pk: int):
+        with self._lock:
+            self._bump(container_pk)
+            if self._containers is not None:
+                self._dirty.add(container_pk)
+
+    def add_placement(self, container_pk: int, start: dict, end: dict):
+        with self._lock:
+            self._bump(container_pk)
+            if self._containers is None or container_pk in self._dirty:
+                return
+            space = self._containers.get(container_pk)
+            if space is None:
+                self._dirty.add(container_pk)
+                return
+            # Carved in place, so a rebuild that started earlier must not replace it
+            with space.lock:
+                space.carve(_placement_box(start, end))
+
+    def _load(self, db: Session, container_pks: Optional[set] = None):
+        containers = db.query(Container.id, Container.containerId, Container.zone, Container.width, Container.depth, Container.height)
+        placements = db.query(ItemPlacement.container_id, ItemPlacement.start_coordinates, ItemPlacement.end_coordinates)
+        if container_pks is not None:
+            containers = containers.filter(Container.id.in_(container_pks))
+            placements = placements.filter(ItemPlacement.container_id.in_(container_pks))
+
+        spaces = {row.id: _ContainerSpace(row.containerId, row.zone, row.width, row.depth, row.height) for row in containers.all()}
+        for container_pk, start, end in placements.all():
+            space = spaces.get(container_pk)
+            if space is not None:
+                space.carve(_placement_box(start, end))
+        return spaces
+
+    def _current_spaces(self, db: Session) -> List[_ContainerSpace]:
+        """
+        Spaces to answer a query from, rebuilding missing or dirty containers
+        outside the state lock first.
+        """
+        with self._lock:
+            if self._containers is not None and not self._dirty:
+                return list(self._containers.values())
+
+        with self._build_lock:
+            with self._lock:
+                if self._containers is not None and not self._dirty:
+                    return list(self._containers.values())
+                generation = self._generation
+                stamps = dict(self._stamps)
+                container_pks = None if self._containers is None else set(self._dirty)
+
+            built = self._load(db, container_pks)
+
+            with self._lock:
+                if container_pks is None:
+                    view = built
+                    if self._generation == generation:
+                        self._containers = built
+                        self._dirty = {pk for pk, stamp in self._stamps.items() if stamp != stamps.get(pk)}
+                    return list(view.values())
+
+                view = dict(self._containers) if self._containers is not None else {}
+                for container_pk in container_pks:
+                    view.pop(container_pk, None)
+                view.update(built)
+                if self._containers is not None and self._generation == generation:
+                    for container_pk in container_pks:
+                        if self._stamps.get(container_pk) != stamps.get(container_pk):
+                            continue  # Changed while loading; stays dirty
+                        self._dirty.discard(container_pk)
+                        if container_pk in built:
+                            self._containers[container_pk] = built[container_pk]
+                        else:
+                            self._containers.pop(container_pk, None)
+                return list(view.values())
+
+    def find(self, db: Session, dims: tuple, zone: Optional[str] = None, allow_rotation: bool = True, limit: int = 10) -> List[dict]:
+        box_volume = dims[0] * dims[1] * dims[2]
+        box_sorted = sorted(dims)
+        orientations = list(dict.fromkeys(permutations(dims))) if allow_rotation else [tuple(dims)]
+
+        best = []  # Heap of (-waste, -depth, counter, slot) keeping the `limit` best fits
+        counter = 0
+        for space in self._current_spaces(db):
+            if zone and space.zone != zone:
+                continue
+            with space.lock:
+                by_volume, volumes, max_dims = space.summary()
+            if not by_volume or any(size > bound for size, bound in zip(box_sorted, max_dims)):
+                continue
+
+            # Skip straight to the smallest cuboids with enough volume
+            for volume, cuboid in by_volume[bisect_left(volumes, box_volume):]:
+                waste = volume - box_volume
+                if len(best) == limit and waste > -best[0][0]:
+                    break  # Later cuboids are larger and can only waste more than the current worst pick
+                free = (cuboid[3] - cuboid[0], cuboid[4] - cuboid[1], cuboid[5] - cuboid[2])
+                orientation = next(
+                    (o for o in orientations if o[0] <= free[0] and o[1] <= free[1] and o[2] <= free[2]), None
+                )
+                if orientation is None:
+                    continue
+
+                counter += 1
+                slot = {
+                    "containerId": space.containerId,
+                    "zone": space.zone,
+                    "orientation": {"width": orientation[0], "depth": orientation[1], "height": orientation[2]},
+                    "position": {
+                        "startCoordinates": {"width": cuboid[0], "depth": cuboid[1], "height": cuboid[2]},
+                        "endCoordinates": {
+                            "width": cuboid[0] + orientation[0],
+                            "depth": cuboid[1] + orientation[1],
+                            "height": cuboid[2] + orientation[2]
+                        }
+                    },
+                    "freeSpace": {"width": free[0], "depth": free[1], "height": free[2]},
+                    "wastedVolume": waste
+                }
+                # Least wasted volume first, then closest to the open face (depth 0)
+                entry = (-waste, -cuboid[1], -counter, slot)
+                if len(best) < limit:
+                    heapq.heappush(best, entry)
+                else:
+                    heapq.heappushpop(best, entry)
+
+        return [entry[3] for entry in sorted(best, reverse=True)]
+
+
+def _placement_box(start: dict, end: dict) -> tuple:
+    return (start["width"], start["depth"], start["height"], end["width"], end["depth"], end["height"])
+
+
+space_index = FreeSpaceIndex()
+register_cache_invalidator(space_index.invalidate, scope="space")
+
+
+# API: Find Free Space
+@app.get("/api/space/find")
+def find_free_space(
+    width: int = Query(..., gt=0, example=30),
+    depth: int = Query(..., gt=0, example=20),
+    height: int = Query(..., gt=0, example=40),
+    zone: Optional[str] = Query(None, example="ZoneA"),
+    allowRotation: bool = Query(True),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    try:
+        slots = space_index.find(db, (width, depth, height), zone=zone, allow_rotation=allowRotation, limit=limit)
+        return {"success": True, "found": bool(slots), "slots": slots}
+    except Exception as e:
+        logging.error(f"Error finding free space: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to find free space")
+
+
+# Bulk placement: shared by arrangement import and batch placement confirmation
+PLACEMENT_LOOKUP_CHUNK = 500  # Keeps IN (...) lookups below SQLite's bound-parameter limit
+
+
+def _chunked(values: list, size: int = PLACEMENT_LOOKUP_CHUNK):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _boxes_overlap(a: tuple, b: tuple) -> bool:
+    return a[0] < b[3] and b[0] < a[3] and a[1] < b[4] and b[1] < a[4] and a[2] < b[5] and b[2] < a[5]
+
+
+def find_overlapping_pairs(boxes: List[tuple]) -> List[tuple]:
+    """
+    Sweep-line overlap detection over (key, box) pairs. Boxes are visited in
+    order of their start along the width axis and only compared with boxes
+    still open at that point, so a mostly disjoint layout costs O(n log n)
+    instead of the all-pairs O(n^2). Returns the key pairs that intersect with
+    positive volume (touching faces are allowed).
+    """
+    active = []  # Heap of (end width, sequence, key, box)
+    pairs = []
+    for sequence, (key, box) in enumerate(sorted(boxes, key=lambda entry: entry[1][0])):
+        while active and active[0][0] <= box[0]:
+            heapq.heappop(active)
+        for _, _, other_key, other_box in active:
+            if _boxes_overlap(box, other_box):
+                pairs.append((other_key, key))
+        heapq.heappush(active, (box[3], sequence, key, box))
+    return pairs
+
+
+def _position_box(position: dict) -> tuple:
+    start = position["startCoordinates"]
+    end = position["endCoordinates"]
+    box = _placement_box(start, end)
+    if any(not isinstance(value, (int, float)) or isinstance(value, bool) for value in box):
+        raise ValueError("Coordinates must be numbers")
+    return box
+
+
+def bulk_place(
+    db: Session,
+    entries: List[dict],
+    user_id: Optional[str] = None,
+    source: str = "batch",
+    timestamp: Optional[str] = None
+) -> List[dict]:
+    """
+    Validate and apply many placements in one transaction.
+
+    Each entry has itemId, containerId and position. Items and containers are
+    resolved with chunked IN queries, positions are checked against container
+    bounds, and overlaps are checked with a sweep line per container, against
+    both the batch and items already placed there. Items in the batch may move,
+    so their current boxes are free unless their own move is rejected, in which
+    case they stay where they are and block the space again. When two batch
+    entries overlap, the earlier one wins. All accepted placements, counter
+    updates and log entries are committed together; rejected entries leave the
+    item untouched. A client-supplied timestamp is kept in the log details.
+    Returns one result per entry, in order.
+    """
+    results = [{"itemId": entry.get("itemId"), "success": False} for entry in entries]
+
+    item_ids = list({entry["itemId"] for entry in entries})
+    container_ids = list({entry["containerId"] for entry in entries})
+    items = {}
+    for chunk in _chunked(item_ids):
+        for row in db.execute(select(Item.id, Item.itemId, Item.mass).where(Item.itemId.in_(chunk))):
+            items[row.itemId] = row
+    containers = {}
+    for chunk in _chunked(container_ids):
+        query = select(Container.id, Container.containerId, Container.width, Container.depth, Container.height)
+        for row in db.execute(query.where(Container.containerId.in_(chunk))):
+            containers[row.containerId] = row
+
+    # 1. Per-entry checks
+    candidates = {}  # entry index -> (item row, container row, box)
+    seen_items = set()
+    for index, entry in enumerate(entries):
+        item = items.get(entry["itemId"])
+        container = containers.get(entry["containerId"])
+        try:
+            box = _position_box(entry["position"])
+        except (KeyError, TypeError, ValueError) as e:
+            results[index]["message"] = f"Invalid position format: {e}"
+            continue
+        if not item:
+            results[index]["message"] = f"Item with ID {entry['itemId']} not found"
+        elif not container:
+            results[index]["message"] = f"Container with ID {entry['containerId']} not found"
+        elif item.itemId in seen_items:
+            results[index]["message"] = f"Item {item.itemId} appears more than once in the batch"
+        elif not is_valid_position(entry["position"], container):
+            results[index]["message"] = "Invalid position within container"
+        else:
+            seen_items.add(item.itemId)
+            candidates[index] = (item, container, box)
+
+    # 2. Current placements: boxes of moving items are freed, everything else
+    #    in the target containers stays fixed
+    moving_pks = [item.id for item, _, _ in candidates.values()]
+    moving_pk_set = set(moving_pks)
+    previous = {}  # item pk -> current placement row
+    for chunk in _chunked(moving_pks):
+        for row in db.execute(
+            select(ItemPlacement.id, ItemPlacement.item_id, ItemPlacement.container_id, ItemPlacement.start_coordinates,
+                   ItemPlacement.end_coordinates, Item.itemId, Item.mass)
+            .join(Item, Item.id == ItemPlacement.item_id)
+            .where(ItemPlacement.item_id.in_(chunk))
+        ):
+            previous[row.item_id] = row
+
+    fixed_by_container = {}
+    target_pks = list({container.id for _, container, _ in candidates.values()})
+    for chunk in _chunked(target_pks):
+        fixed = db.execute(
+            select(ItemPlacement.item_id, ItemPlacement.container_id, ItemPlacement.start_coordinates,
+                   ItemPlacement.end_coordinates, Item.itemId)
+            .join(Item, Item.id == ItemPlacement.item_id)
+            .where(ItemPlacement.container_id.in_(chunk))
+        ).all()
+        for row in fixed:
+            if row.item_id not in moving_pk_set:
+                fixed_by_container.setdefault(row.container_id, []).append(
+                    (("fixed", row.itemId), _placement_box(row.start_coordinates, row.end_coordinates))
+                )
+
+    # 3. Overlaps, resolved in entry order. A rejected mover keeps its current
+    #    box, which may block entries accepted in an earlier pass, so repeat
+    #    until no new rejections appear; the rejected set only grows.
+    rejected = {}  # entry index -> message
+    while True:
+        boxes_by_container = {pk: list(boxes) for pk, boxes in fixed_by_container.items()}
+        for index in rejected:
+            row = previous.get(candidates[index][0].id)
+            if row is not None:
+                boxes_by_container.setdefault(row.container_id, []).append(
+                    (("fixed", row.itemId), _placement_box(row.start_coordinates, row.end_coordinates))
+                )
+        for index, (_, container, box) in candidates.items():
+            if index not in rejected:
+                boxes_by_container.setdefault(container.id, []).append((("new", index), box))
+
+        conflicts = {}
+        for boxes in boxes_by_container.values():
+            for first, second in find_overlapping_pairs(boxes):
+                conflicts.setdefault(first, []).append(second)
+                conflicts.setdefault(second, []).append(first)
+
+        accepted = []
+        newly_rejected = {}
+        for index in sorted(candidates):
+            if index in rejected:
+                continue
+            blocking = next((
+                other for other in conflicts.get(("new", index), [])
+                if other[0] == "fixed" or other[1] in accepted
+            ), None)
+            if blocking is None:
+                accepted.append(index)
+            else:
+                other_item = blocking[1] if blocking[0] == "fixed" else entries[blocking[1]]["itemId"]
+                newly_rejected[index] = f"Overlaps with item {other_item}"
+        if not newly_rejected:
+            break
+        rejected.update(newly_rejected)
+
+    for index, message in rejected.items():
+        results[index]["message"] = message
+
+    if not accepted:
+        return results
+
+    # 4. Apply everything in one transaction
+    usage_deltas = {}
+
+    def add_usage(container_pk, box, mass, sign):
+        volume, surface = _box_metrics(
+            {"width": box[0], "depth": box[1], "height": box[2]},
+            {"width": box[3], "depth": box[4], "height": box[5]}
+        )
+        delta = usage_deltas.setdefault(container_pk, [0, 0.0, 0, 0])
+        delta[0] += sign * volume
+        delta[1] += sign * (mass or 0.0)
+        delta[2] += sign
+        delta[3] += sign * surface
+
+    # Only accepted movers leave their current position
+    moved = [previous[candidates[index][0].id] for index in accepted if candidates[index][0].id in previous]
+    for row in moved:
+        add_usage(row.container_id, _placement_box(row.start_coordinates, row.end_coordinates), row.mass, -1)
+    for chunk in _chunked([row.id for row in moved]):
+        db.execute(delete(ItemPlacement).where(ItemPlacement.id.in_(chunk)).execution_options(synchronize_session=False))
+
+    now = datetime.now()
+    new_placements = []
+    log_rows = []
+    log_details = {"source": source}
+    if timestamp:
+        log_details["timestamp"] = timestamp
+    for index in accepted:
+        item, container, box = candidates[index]
+        start = entries[index]["position"]["startCoordinates"]
+        end = entries[index]["position"]["endCoordinates"]
+        start = {dim: start[dim] for dim in ("width", "depth", "height")}
+        end = {dim: end[dim] for dim in ("width", "depth", "height")}
+        new_placements.append({
+            "item_id": item.id,
+            "container_id": container.id,
+            "start_coordinates": start,
+            "end_coordinates": end
+        })
+        log_rows.append({
+            "timestamp": now,
+            "user_id": user_id,
+            "action_type": "placement",
+            "item_id": item.itemId,
+            "container_id": container.containerId,
+            "details": {"startCoordinates": start, "endCoordinates": end, **log_details}
+        })
+        add_usage(container.id, box, item.mass, 1)
+        results[index]["success"] = True
+
+    db.execute(insert(ItemPlacement), new_placements)
+    db.execute(insert(Log), log_rows)
+    for container_pk, (volume, mass, item_delta, surface) in usage_deltas.items():
+        _upsert_container_usage(db, container_pk, volume, mass, item_delta, surface)
+    db.commit()
+
+    for container_pk in usage_deltas:
+        space_index.mark_dirty(container_pk)
+    return results
+
+
+def find_item(db: Session, itemId: Optional[str], itemName: Optional[str]) -> dict:
+    query = db.query(Item)
+    item = query.filter(Item.itemId == itemId).first() if itemId else query.filter(Item.name == itemName).first()
+
+    if not item:
+        return {
+            "success": True,
+            "found": False,
+            "item": None,
+            "retrievalSteps": []
+        }
+
+    return {
+        "success": True,
+        "found": True,
+        "item": {
+            "itemId": item.itemId,
+            "name": item.name,
+            "containerId": "contA",  # Placeholder
+            "zone": item.preferredZone,
+            "position": {
+                "startCoordinates": {"width": 0, "depth": 0, "height": 0},
+                "endCoordinates": {"width": item.width, "depth": item.depth, "height": item.height}
+            }
+        },
+        "retrievalSteps": [
+            {"step": 1, "action": "retrieve", "itemId": item.itemId, "itemName": item.name}
+        ]
+    }
+
+
+# API: Item Search and Retrieval
+@app.get("/api/search", response_model=SearchResponse)
+def search_item(
+    itemId: Optional[str] = Query(None),
+    itemName: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+):
+    try:
+        if not itemId and not itemName:
+            raise HTTPException(status_code=400, detail="Either itemId or itemName must be provided")
+
+        # Only the lookup key that is actually used goes into the coalescing key
+        params = {"itemId": itemId} if itemId else {"itemName": itemName}
+        return coalescer.do("/api/search", params, lambda: find_item(db, itemId, itemName))
+
+    except HTTPException as e:
+        raise e  # Keep standard FastAPI behavior for expected errors
+    except Exception as e:
+        logging.error(f"Error searching item: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+# API: Retrieve Item
+@app.post("/api/retrieve", response_model=ApiResponse)
+def retrieve_item(req: RetrieveRequest, db: Session = Depends(get_db)):
+    try:
+        logging.info(f"Retrieve request received: {req}")
+
+        item = db.query(Item).filter(Item.itemId == req.itemId).first()
+        if not item:
+            raise HTTPException(status_code=404, detail=f"Item with ID {req.itemId} not found")
+
+        # 1. Update usageLimit if applicable and not None
+        if item.usageLimit is not None and item.usageLimit > 0:
+            item.usageLimit -= 1
+            logging.info(f"Usage limit decremented for item {req.itemId}. New usageLimit: {item.usageLimit}")
+        else:
+            logging.info(f"No usage limit update needed for item {req.itemId} (usageLimit={item.usageLimit})")
+
+        # 2. The item leaves its container until it is placed again
+        placement = remove_item_placement(db, item)
+
+        # 3. Log the retrieval in the same commit, so state reconstruction
+        # never sees the change without its log entry or vice versa
+        db.add(Log(
+            user_id=req.userId,
+            action_type="retrieval",
+            item_id=req.itemId,
+            details={"timestamp": req.timestamp}
+        ))
+        db.commit()
+        if placement:
+            space_index.mark_dirty(placement.container_id)
+        logging.info(f"Log entry created for item {req.itemId} retrieval")
+
+        return {"success": True}
+
+    except HTTPException as e:
+        db.rollback()
+        raise e
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error retrieving item: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to retrieve item")
+
+
+def find_waste_items(db: Session) -> dict:
+    today = datetime.now().date()
+    waste_items = []
+    items = db.execute(
+        select(Item.itemId, Item.name, Item.width, Item.depth, Item.height, Item.expiryDate, Item.usageLimit)
+        .where(or_(Item.expiryDate < today, Item.usageLimit == 0))
+    ).all()
+
+    for item in items:
+        reason = None
+
+        # Handle expiry date
+        if item.expiryDate and item.expiryDate < today:
+            reason = "Expired"
+
+        # Handle usage limit only if not None
+        elif item.usageLimit is not None and item.usageLimit == 0:
+            reason = "Out of Uses"
+
+        if reason:
+            waste_items.append({
+                "itemId": item.itemId,
+                "name": item.name,
+                "reason": reason,
+                "containerId": "contA",  # Placeholder
+                "position": {
+                    "startCoordinates": {"width": 0, "depth": 0, "height": 0},
+                    "endCoordinates": {
+                        "width": item.width,
+                        "depth": item.depth,
+                        "height": item.height
+                    }
+                }
+            })
+
+    return {
+        "success": True,
+        "wasteItems": waste_items
+    }
+
+
+# API: Identify Waste Items
+@app.get("/api/waste/identify", response_model=WasteIdentifyResponse)
+def identify_waste_items(request: Request, db: Session = Depends(get_db)):
+    try:
+        # Requests for different reference dates must not share a result
+        params = {"today": datetime.now().date().isoformat()}
+        body = coalescer.do("/api/waste/identify", params, lambda: dumps_json(find_waste_items(db)))
+        return fast_json_response(request, body)
+
+    except Exception as e:
+        logging.error(f"Error identifying waste: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to identify waste items")
+
+
+# API: Generate Waste Return Plan
+@app.post("/api/waste/return-plan", response_model=WasteReturnPlanResponse)
+def generate_waste_return_plan(req: WasteReturnPlanRequest, db: Session = Depends(get_db)):
+    try:
+        return_plan = []
+        retrieval_steps = []
+        return_manifest = {
+            "undockingContainerId": req.undockingContainerId,
+            "undockingDate": req.undockingDate,
+            "returnItems": [],
             "totalVolume": 0,
             "totalWeight": 0
         }
@@ -739,24 +2405,58 @@ def generate_waste_return_plan(req: WasteReturnPlanRequest, db: Session = Depend
 
 
 # API: Complete Waste Undocking
-@app.post("/api/waste/complete-undocking", response_model=ApiResponse)
+@app.post("/api/waste/complete-undocking", response_model=CompleteUndockingResponse)
 def complete_undocking(req: CompleteUndockingRequest, db: Session = Depends(get_db)):
     try:
         # Basic validation
         if not req.undockingContainerId or not req.timestamp:
             raise HTTPException(status_code=400, detail="Both container ID and timestamp are required.")
 
-        # Placeholder logic - assume 5 items removed
-        removed_count = 5  # Replace with real count once logic is implemented
+        container = db.query(Container).filter(Container.containerId == req.undockingContainerId).first()
+        if not container:
+            raise HTTPException(status_code=404, detail=f"Container with ID {req.undockingContainerId} not found")
+
+        # Everything below runs as set-based statements in a single transaction:
+        # one SELECT for the log rows, one bulk log INSERT and two bulk DELETEs.
+        placed_items = select(ItemPlacement.item_id).where(ItemPlacement.container_id == container.id)
+        removed_item_ids = db.execute(
+            select(Item.itemId).where(Item.id.in_(placed_items))
+        ).scalars().all()
+        removed_count = len(removed_item_ids)
+
+        if removed_item_ids:
+            now = datetime.now()
+            db.execute(insert(Log), [
+                {
+                    "timestamp": now,
+                    "user_id": req.userId,
+                    "action_type": "disposal",
+                    "item_id": item_id,
+                    "container_id": req.undockingContainerId,
+                    "details": {"reason": "undocking", "timestamp": req.timestamp},
+                }
+                for item_id in removed_item_ids
+            ])
+
+        db.execute(
+            delete(Item).where(Item.id.in_(placed_items)).execution_options(synchronize_session=False)
+        )
+        db.execute(
+            delete(ItemPlacement).where(ItemPlacement.container_id == container.id).execution_options(synchronize_session=False)
+        )
+        db.execute(delete(ContainerUsage).where(ContainerUsage.container_id == container.id))
+        db.commit()
+        space_index.mark_dirty(container.id)
 
-        # Optional logging
         logging.info(f"Undocking completed for container {req.undockingContainerId} at {req.timestamp}, items removed: {removed_count}")
 
-        return {"success": True}  # Ensure only fields defined in ApiResponse are returned
+        return {"success": True, "itemsRemoved": removed_count}
 
     except HTTPException:
+        db.rollback()
         raise
     except Exception as e:
+        db.rollback()
         logging.error(f"Error completing undocking: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to complete undocking")
 
@@ -791,6 +2491,11 @@ def simulate_time(req: TimeSimulationRequest, db: Session = Depends(get_db)):
             item_from_db = db.query(Item).filter(Item.itemId == used_item["itemId"]).first()
             if item_from_db:
                 item_from_db.usageLimit = max(0, item_from_db.usageLimit - 1)  #  Decrement usage
+                db.add(Log(
+                    action_type="usage",
+                    item_id=item_from_db.itemId,
+                    details={"usageLimit": item_from_db.usageLimit, "simulatedDate": new_date.isoformat()}
+                ))
                 db.commit()
                 items_used.append({"itemId": item_from_db.itemId, "name": item_from_db.name, "remainingUses": item_from_db.usageLimit})
 
@@ -810,44 +2515,185 @@ def simulate_time(req: TimeSimulationRequest, db: Session = Depends(get_db)):
         raise
 
 
-# API: Import Items from CSV
-@app.post("/api/import/items", response_model=ImportResponse)
-def import_items(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    try:
-        contents = file.file.read().decode('utf-8')
-        reader = csv.DictReader(contents.splitlines())
-        items_imported = 0
-        errors = []
+# Monte Carlo consumption forecast
+FORECAST_CHUNK_TRAJECTORIES = 1000  # Trajectories per worker task (~8MB of float64 per 1k items)
+FORECAST_INLINE_SAMPLES = 2_000_000  # Below this many trajectory x item samples, skip the process pool
 
-        for row in reader:
+_forecast_pool = None
+_forecast_pool_lock = threading.Lock()
+
+
+def _get_forecast_pool() -> ProcessPoolExecutor:
+    """
+    Worker processes never fork the app (with its open database connections and
+    background threads); they start fresh and import only forecast_sim.
+    """
+    global _forecast_pool
+    with _forecast_pool_lock:
+        if _forecast_pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _forecast_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context(method)
+            )
+        return _forecast_pool
+
+
+@app.on_event("shutdown")
+def _shutdown_forecast_pool():
+    global _forecast_pool
+    with _forecast_pool_lock:
+        if _forecast_pool is not None:
+            _forecast_pool.shutdown(cancel_futures=True)
+            _forecast_pool = None
+
+
+def forecast_depletion_days(remaining, rates, expiry_days, horizon, num_trajectories, seed=None) -> np.ndarray:
+    """
+    Run the trajectories in chunks, fanned out over the process pool for large
+    workloads, and return a (num_trajectories, num_items) array of depletion days.
+    """
+    chunks = [
+        min(FORECAST_CHUNK_TRAJECTORIES, num_trajectories - start)
+        for start in range(0, num_trajectories, FORECAST_CHUNK_TRAJECTORIES)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    tasks = [(remaining, rates, expiry_days, horizon, n, s) for n, s in zip(chunks, seeds)]
+
+    if num_trajectories * remaining.size <= FORECAST_INLINE_SAMPLES:
+        results = [simulate_depletion_days(task) for task in tasks]
+    else:
+        results = list(_get_forecast_pool().map(simulate_depletion_days, tasks))
+    return np.concatenate(results, axis=0)
+
+
+# API: Forecast Consumption
+@app.post("/api/forecast/consumption", response_model=ConsumptionForecastResponse)
+def forecast_consumption(req: ConsumptionForecastRequest, db: Session = Depends(get_db)):
+    try:
+        if not 1 <= req.numTrajectories <= 100000:
+            raise HTTPException(status_code=400, detail="numTrajectories must be between 1 and 100000")
+        if not 1 <= req.horizonDays <= 3650:
+            raise HTTPException(status_code=400, detail="horizonDays must be between 1 and 3650")
+        if not req.quantiles or any(not 0 < q < 1 for q in req.quantiles):
+            raise HTTPException(status_code=400, detail="quantiles must be between 0 and 1")
+
+        rate_by_item = {}
+        for entry in req.usageRates:
             try:
-                #  Validate data types from CSV
-                item_data = {}
-                item_data["itemId"] = row["itemId"]
-                item_data["name"] = row["name"]
-                item_data["width"] = int(row["width"])
-                item_data["depth"] = int(row["depth"])
-                item_data["height"] = int(row["height"])
-                item_data["mass"] = float(row["mass"])
-                item_data["priority"] = int(row["priority"])
-                if row.get("expiryDate"):
-                    item_data["expiryDate"] = datetime.strptime(row["expiryDate"], "%Y-%m-%d").date()
-                item_data["usageLimit"] = int(row["usageLimit"])
-                item_data["preferredZone"] = row["preferredZone"]
-
-                item = ItemSchema(**item_data)
-                db_item = Item(**item.dict())
-                db.add(db_item)
-                db.commit()
-                items_imported += 1
-            except (ValueError, KeyError) as e:
-                errors.append({"row": row, "message": str(e)})
+                rate_by_item[entry["itemId"]] = max(0.0, float(entry["usesPerDay"]))
+            except (KeyError, TypeError, ValueError):
+                raise HTTPException(status_code=400, detail=f"Invalid usage rate entry: {entry}")
+
+        query = db.query(Item.itemId, Item.name, Item.usageLimit, Item.expiryDate)
+        if req.itemIds:
+            query = query.filter(Item.itemId.in_(req.itemIds))
+        items = query.order_by(Item.id).all()
+
+        today = datetime.now().date()
+        horizon = req.horizonDays
+
+        forecasts = []
+        if items:
+            remaining = np.array([item.usageLimit or 0 for item in items], dtype=np.float64)
+            rates = np.array([rate_by_item.get(item.itemId, req.defaultUsesPerDay) for item in items], dtype=np.float64)
+            # An item stops being usable the day after it expires
+            expiry_days = np.array([
+                min(max((item.expiryDate - today).days + 1, 0), horizon + 1) if item.expiryDate else horizon + 1
+                for item in items
+            ], dtype=np.int32)
+
+            days = forecast_depletion_days(remaining, rates, expiry_days, horizon, req.numTrajectories, req.seed)
+            depletion_quantiles = np.quantile(days, req.quantiles, axis=0, method="inverted_cdf")
+            probability_depleted = (days <= horizon).mean(axis=0)
+
+            labels = [f"p{round(q * 100, 2):g}" for q in req.quantiles]
+            for index, item in enumerate(items):
+                depletion_dates = {}
+                for label, day in zip(labels, depletion_quantiles[:, index]):
+                    day = int(day)
+                    depletion_dates[label] = (today + timedelta(days=day)).strftime("%Y-%m-%d") if day <= horizon else None
+
+                forecasts.append({
+                    "itemId": item.itemId,
+                    "name": item.name,
+                    "remainingUses": item.usageLimit,
+                    "expiryDate": item.expiryDate.strftime("%Y-%m-%d") if item.expiryDate else None,
+                    "probabilityDepleted": round(float(probability_depleted[index]), 4),
+                    "depletionDates": depletion_dates
+                })
 
         return {
             "success": True,
-            "itemsImported": items_imported,
-            "errors": errors
+            "startDate": today.strftime("%Y-%m-%d"),
+            "horizonDays": horizon,
+            "numTrajectories": req.numTrajectories,
+            "forecasts": forecasts
         }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error forecasting consumption: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to forecast consumption")
+
+
+def import_item_rows(db: Session, contents: str, progress=None) -> dict:
+    """
+    Import items from CSV text.
+    """
+    lines = contents.splitlines()
+    reader = csv.DictReader(lines)
+    total_rows = max(len(lines) - 1, 0)
+    items_imported = 0
+    errors = []
+
+    for row_number, row in enumerate(reader):
+        if progress:
+            progress(row_number, total_rows)
+        try:
+            #  Validate data types from CSV
+            item_data = {}
+            item_data["itemId"] = row["itemId"]
+            item_data["name"] = row["name"]
+            item_data["width"] = int(row["width"])
+            item_data["depth"] = int(row["depth"])
+            item_data["height"] = int(row["height"])
+            item_data["mass"] = float(row["mass"])
+            item_data["priority"] = int(row["priority"])
+            if row.get("expiryDate"):
+                item_data["expiryDate"] = datetime.strptime(row["expiryDate"], "%Y-%m-%d").date()
+            item_data["usageLimit"] = int(row["usageLimit"])
+            item_data["preferredZone"] = row["preferredZone"]
+
+            item = ItemSchema(**item_data)
+            db_item = Item(**item.dict())
+            db.add(db_item)
+            log_item_creation(db, db_item)
+            db.commit()
+            items_imported += 1
+        except (ValueError, KeyError) as e:
+            errors.append({"row": row, "message": str(e)})
+
+    return {
+        "success": True,
+        "itemsImported": items_imported,
+        "errors": errors
+    }
+
+
+# API: Import Items from CSV
+@app.post("/api/import/items", response_model=ImportResponse)
+def import_items(
+    file: UploadFile = File(...),
+    async_mode: bool = Query(False, alias="async"),
+    db: Session = Depends(get_db)
+):
+    try:
+        contents = file.file.read().decode('utf-8')
+        if async_mode:
+            return job_submitted_response(submit_job("import_items", import_item_rows, contents))
+        return import_item_rows(db, contents)
     except Exception as e:
         logging.error(f"Error importing items: {e}")
         raise
@@ -882,6 +2728,9 @@ def import_containers(file: UploadFile = File(...), db: Session = Depends(get_db
                 db.rollback()
                 errors.append({"row": row, "message": str(e)})
 
+        if containers_imported:
+            space_index.invalidate()
+
         return ImportResponse(
             success=True,
             itemsImported=containers_imported,  # Reuse `itemsImported` for compatibility
@@ -892,40 +2741,399 @@ def import_containers(file: UploadFile = File(...), db: Session = Depends(get_db
         logging.error(f"Error importing containers: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to import containers")
 
+
+# Arrangement CSV import
+ARRANGEMENT_COLUMNS = {
+    "itemid": "itemId",
+    "containerid": "containerId",
+    "startcoordinates": "startCoordinates",
+    "endcoordinates": "endCoordinates"
+}
+
+
+def _parse_arrangement_coordinates(value: str) -> dict:
+    """
+    Accepts the exported dict form ("{'width': 0, 'depth': 0, 'height': 0}")
+    or a plain "(width, depth, height)" tuple.
+    """
+    try:
+        parsed = ast.literal_eval(value.strip())
+    except (ValueError, SyntaxError):
+        raise ValueError(f"could not parse coordinates {value!r}")
+    if isinstance(parsed, (tuple, list)) and len(parsed) == 3:
+        parsed = dict(zip(("width", "depth", "height"), parsed))
+    if not isinstance(parsed, dict) or any(dim not in parsed for dim in ("width", "depth", "height")):
+        raise ValueError("coordinates must give width, depth and height")
+    return {dim: parsed[dim] for dim in ("width", "depth", "height")}
+
+
+# API: Import Arrangement from CSV
+@app.post("/api/import/arrangement", response_model=ArrangementImportResponse)
+def import_arrangement(
+    file: UploadFile = File(...),
+    userId: Optional[str] = Query(None, example="astronaut1"),
+    db: Session = Depends(get_db)
+):
+    try:
+        # Rows are parsed as they are read rather than decoding the whole upload first
+        reader = csv.reader(io.TextIOWrapper(file.file, encoding="utf-8-sig", newline=""))
+        header = next(reader, None)
+        if not header:
+            raise HTTPException(status_code=400, detail="The arrangement file is empty")
+
+        columns = {}
+        for index, name in enumerate(header):
+            field = ARRANGEMENT_COLUMNS.get(name.replace(" ", "").replace("_", "").lower())
+            if field:
+                columns[field] = index
+        missing = [name for name in ARRANGEMENT_COLUMNS.values() if name not in columns]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Missing columns: {', '.join(missing)}")
+
+        entries = []
+        errors = []
+        rows_skipped = 0
+        for row_number, row in enumerate(reader, start=2):
+            if not any(cell.strip() for cell in row):
+                continue
+            item_id = row[columns["itemId"]].strip() if len(row) > columns["itemId"] else None
+            try:
+                container_id = row[columns["containerId"]].strip()
+                if container_id in ("", "N/A"):
+                    rows_skipped += 1  # Items the export listed without a placement
+                    continue
+                entries.append({
+                    "row": row_number,
+                    "itemId": item_id,
+                    "containerId": container_id,
+                    "position": {
+                        "startCoordinates": _parse_arrangement_coordinates(row[columns["startCoordinates"]]),
+                        "endCoordinates": _parse_arrangement_coordinates(row[columns["endCoordinates"]])
+                    }
+                })
+            except (IndexError, ValueError) as e:
+                errors.append({"row": row_number, "itemId": item_id, "message": f"Invalid row: {e}"})
+
+        results = bulk_place(db, entries, user_id=userId, source="arrangement-import") if entries else []
+        placements_imported = 0
+        for entry, result in zip(entries, results):
+            if result["success"]:
+                placements_imported += 1
+            else:
+                errors.append({"row": entry["row"], "itemId": entry["itemId"], "message": result["message"]})
+        errors.sort(key=lambda error: error["row"])
+
+        return {
+            "success": True,
+            "placementsImported": placements_imported,
+            "rowsSkipped": rows_skipped,
+            "errors": errors
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error importing arrangement: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to import arrangement")
+
+
+def build_arrangement_csv(db: Session, progress=None) -> str:
+    """
+    Render the current arrangement as CSV text.
+    """
+    rows = [["ItemID", "ContainerID", "Start Coordinates", "End Coordinates"]]  # Header row
+
+    items = db.query(Item).all()
+    for index, item in enumerate(items):
+        if progress:
+            progress(index, len(items))
+        try:
+            placement = db.query(ItemPlacement).filter(ItemPlacement.item_id == item.id).first()
+            if placement:
+                container = db.query(Container).filter(Container.id == placement.container_id).first()
+                rows.append([
+                    item.itemId or "N/A",
+                    container.containerId if container else "N/A",
+                    str(placement.start_coordinates) if placement.start_coordinates else "N/A",
+                    str(placement.end_coordinates) if placement.end_coordinates else "N/A"
+                ])
+            else:
+                rows.append([item.itemId or "N/A", "N/A", "N/A", "N/A"])
+        except Exception as inner_err:
+            logging.warning(f"Skipping item {item.itemId} due to error: {inner_err}")
+            rows.append([item.itemId or "N/A", "Error", "Error", "Error"])
+
+    # csv.writer quotes the coordinate cells, which contain commas
+    output = io.StringIO()
+    csv.writer(output, lineterminator="\n").writerows(rows)
+    return output.getvalue().rstrip("\n")
+
+
+def export_arrangement_job(db: Session, progress=None) -> dict:
+    return {"filename": "arrangement.csv", "csv": build_arrangement_csv(db, progress)}
+
+
 # API: Export Current Arrangement to CSV
 @app.get("/api/export/arrangement")
-def export_arrangement(db: Session = Depends(get_db)):
+def export_arrangement(async_mode: bool = Query(False, alias="async"), db: Session = Depends(get_db)):
     try:
-        rows = [["ItemID", "ContainerID", "Start Coordinates", "End Coordinates"]]  # Header row
-
-        items = db.query(Item).all()
-        for item in items:
-            try:
-                placement = db.query(ItemPlacement).filter(ItemPlacement.item_id == item.id).first()
-                if placement:
-                    container = db.query(Container).filter(Container.id == placement.container_id).first()
-                    rows.append([
-                        item.itemId or "N/A",
-                        container.containerId if container else "N/A",
-                        str(placement.start_coordinates) if placement.start_coordinates else "N/A",
-                        str(placement.end_coordinates) if placement.end_coordinates else "N/A"
-                    ])
-                else:
-                    rows.append([item.itemId or "N/A", "N/A", "N/A", "N/A"])
-            except Exception as inner_err:
-                logging.warning(f"Skipping item {item.itemId} due to error: {inner_err}")
-                rows.append([item.itemId or "N/A", "Error", "Error", "Error"])
+        if async_mode:
+            return job_submitted_response(submit_job("export_arrangement", export_arrangement_job))
 
-        output = "\n".join([",".join(map(str, row)) for row in rows])
+        output = build_arrangement_csv(db)
         return Response(output, media_type="text/csv", headers={"Content-Disposition": "attachment;filename=arrangement.csv"})
 
     except Exception as e:
         logging.error(f"Error exporting arrangement: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to export arrangement")
 
+# Periodic maintenance: background threads started with the app and stopped
+# on shutdown. Every uvicorn worker runs them, so tasks that must happen once
+# take a lock file (see _acquire_lock_file).
+_maintenance_stop = threading.Event()
+
+
+def run_periodically(name: str, interval_seconds: float, fn):
+    """
+    Call fn(db) with a fresh session now and then every interval_seconds on a
+    daemon thread, until the app shuts down.
+    """
+    def loop():
+        while True:
+            db = SessionLocal()
+            try:
+                refresh_data_version(db)
+                fn(db)
+            except Exception as e:
+                db.rollback()
+                logging.error(f"Periodic {name} failed: {e}", exc_info=True)
+            finally:
+                db.close()
+            if _maintenance_stop.wait(interval_seconds):
+                return
+
+    threading.Thread(target=loop, name=f"hyperdock-{name}", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def _stop_maintenance():
+    _maintenance_stop.set()
+
+
+# Log retention: rows older than the hot window are moved out of SQLite into
+# gzip-compressed JSONL partitions, one per day, each with a small JSON index
+# of the users, items and actions it contains. Archiving runs every
+# LOG_ARCHIVE_INTERVAL_HOURS (0 disables) and on demand.
+LOG_ARCHIVE_DIR = os.environ.get("HYPERDOCK_LOG_ARCHIVE_DIR", "./log_archive")
+LOG_RETENTION_DAYS = int(os.environ.get("HYPERDOCK_LOG_RETENTION_DAYS", "30"))
+LOG_ARCHIVE_INTERVAL_HOURS = float(os.environ.get("HYPERDOCK_LOG_ARCHIVE_INTERVAL_HOURS", "6"))
+LOG_ARCHIVE_BATCH_SIZE = 5000
+LOG_ARCHIVE_LOCK_TIMEOUT = 3600  # Seconds after which a leftover lock file is considered stale
+
+
+def _log_to_dict(log) -> dict:
+    """
+    Accepts a Log instance or a row selected from Log's columns.
+    """
+    return {
+        "id": log.id,
+        "timestamp": log.timestamp.isoformat() if log.timestamp else None,
+        "userId": log.user_id,
+        "actionType": log.action_type,
+        "itemId": log.item_id,
+        "containerId": log.container_id,
+        "details": log.details or {}
+    }
+
+
+def _log_partition_paths(day: date):
+    base = os.path.join(LOG_ARCHIVE_DIR, f"logs-{day.isoformat()}")
+    return base + ".jsonl.gz", base + ".index.json"
+
+
+def _read_log_partition_index(index_path: str) -> Optional[dict]:
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_log_partition(day: date, entries: List[dict]):
+    data_path, index_path = _log_partition_paths(day)
+    index = _read_log_partition_index(index_path) or {
+        "date": day.isoformat(),
+        "count": 0,
+        "maxLogId": 0,
+        "userIds": [],
+        "itemIds": [],
+        "actionTypes": []
+    }
+
+    # Rows at or below maxLogId were archived by an earlier run that failed
+    # before deleting them from SQLite; skip them so re-runs are idempotent.
+    entries = [entry for entry in entries if entry["id"] > index["maxLogId"]]
+    if not entries:
+        return
+
+    # Each run appends a new gzip member; gzip readers treat them as one stream.
+    # The index is the commit record: "bytes" is the data length it covers, so
+    # a member left behind by a run that died before updating the index is cut
+    # off here instead of being duplicated.
+    committed = index.get("bytes")
+    if committed is None:
+        committed = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+    with open(data_path, "r+b" if os.path.exists(data_path) else "wb") as raw:
+        raw.truncate(committed)
+        raw.seek(committed)
+        with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+            f.write("".join(json.dumps(entry, default=str) + "\n" for entry in entries).encode("utf-8"))
+        raw.flush()
+        os.fsync(raw.fileno())
+        index["bytes"] = raw.tell()
+
+    index["count"] += len(entries)
+    index["maxLogId"] = max(index["maxLogId"], max(entry["id"] for entry in entries))
+    for field, key in (("userIds", "userId"), ("itemIds", "itemId"), ("actionTypes", "actionType")):
+        index[field] = sorted(set(index[field]) | {entry[key] for entry in entries if entry[key] is not None})
+
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+
+
+def _acquire_lock_file(name: str) -> Optional[str]:
+    """
+    Cross-process lock (several uvicorn workers may share the archive) using an
+    exclusively created lock file in LOG_ARCHIVE_DIR. Returns the lock path, or
+    None if held.
+    """
+    os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+    lock_path = os.path.join(LOG_ARCHIVE_DIR, name)
+    try:
+        if time.time() - os.path.getmtime(lock_path) > LOG_ARCHIVE_LOCK_TIMEOUT:
+            os.remove(lock_path)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return None
+    return lock_path
+
+
+def archive_logs(db: Session, retention_days: int = LOG_RETENTION_DAYS) -> dict:
+    """
+    Move log rows older than retention_days into daily archive partitions and
+    delete them from the live table.
+    """
+    lock_path = _acquire_lock_file(".archive.lock")
+    if lock_path is None:
+        raise HTTPException(status_code=409, detail="Log archiving is already in progress")
+
+    try:
+        cutoff = datetime.combine(datetime.now().date() - timedelta(days=retention_days), datetime.min.time())
+        archived = 0
+        partitions = set()
+        last_id = 0
+
+        while True:
+            batch = (
+                db.query(Log)
+                .filter(Log.timestamp < cutoff, Log.id > last_id)
+                .order_by(Log.id)
+                .limit(LOG_ARCHIVE_BATCH_SIZE)
+                .all()
+            )
+            if not batch:
+                break
+
+            by_day = {}
+            for log in batch:
+                by_day.setdefault(log.timestamp.date(), []).append(_log_to_dict(log))
+            for day, entries in by_day.items():
+                _write_log_partition(day, entries)
+                partitions.add(day)
+
+            last_id = batch[-1].id
+            db.execute(
+                delete(Log).where(Log.timestamp < cutoff, Log.id <= last_id).execution_options(synchronize_session=False)
+            )
+            db.commit()
+            db.expunge_all()
+            archived += len(batch)
+
+        logging.info(f"Archived {archived} log entries older than {cutoff.date()} into {len(partitions)} partitions")
+        return {
+            "success": True,
+            "logsArchived": archived,
+            "partitionsWritten": sorted(day.isoformat() for day in partitions),
+            "cutoff": cutoff.date().isoformat()
+        }
+    finally:
+        os.remove(lock_path)
+
+
+def read_archived_logs(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    item_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    action_type: Optional[str] = None
+):
+    """
+    Yield archived log entries in [start, end), opening only the partitions
+    whose date falls in range and whose index contains the requested values.
+    """
+    if not os.path.isdir(LOG_ARCHIVE_DIR):
+        return
+
+    for name in sorted(os.listdir(LOG_ARCHIVE_DIR)):
+        if not (name.startswith("logs-") and name.endswith(".index.json")):
+            continue
+        day = datetime.strptime(name[len("logs-"):-len(".index.json")], "%Y-%m-%d").date()
+        if start and day < start.date():
+            continue
+        if end and datetime.combine(day, datetime.min.time()) >= end:
+            continue
+
+        data_path, index_path = _log_partition_paths(day)
+        index = _read_log_partition_index(index_path)
+        if (item_id and item_id not in index["itemIds"]) or \
+                (user_id and user_id not in index["userIds"]) or \
+                (action_type and action_type not in index["actionTypes"]):
+            continue
+
+        # Only the bytes recorded in the index are committed
+        with open(data_path, "rb") as raw:
+            data = raw.read(index["bytes"]) if "bytes" in index else raw.read()
+        with gzip.open(io.BytesIO(data), "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                timestamp = datetime.fromisoformat(entry["timestamp"])
+                if (start and timestamp < start) or (end and timestamp >= end):
+                    continue
+                if (item_id and entry["itemId"] != item_id) or \
+                        (user_id and entry["userId"] != user_id) or \
+                        (action_type and entry["actionType"] != action_type):
+                    continue
+                yield entry
+
+
+def _parse_log_date(value: Optional[str], name: str) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} format. Use YYYY-MM-DD.")
+
+
 # API: Get Logs
 @app.get("/api/logs")
 def get_logs(
+    request: Request,
     startDate: Optional[str] = Query(None, example="2025-03-10"),
     endDate: Optional[str] = Query(None, example="2025-03-15"),
     itemId: Optional[str] = Query(None, example="item001"),
@@ -934,22 +3142,18 @@ def get_logs(
     db: Session = Depends(get_db),
 ):
     try:
-        query = db.query(Log)
-
-        if startDate:
-            try:
-                start_date = datetime.strptime(startDate, "%Y-%m-%d").date()
-                query = query.filter(Log.timestamp >= start_date)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid startDate format. Use YYYY-MM-DD.")
-
-        if endDate:
-            try:
-                end_date = datetime.strptime(endDate, "%Y-%m-%d").date()
-                query = query.filter(Log.timestamp <= end_date)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid endDate format. Use YYYY-MM-DD.")
-
+        start_date = _parse_log_date(startDate, "startDate")
+        end_date = _parse_log_date(endDate, "endDate")
+
+        # Both bounds are whole days: [startDate 00:00, day after endDate 00:00)
+        start = datetime.combine(start_date, datetime.min.time()) if start_date else None
+        end = datetime.combine(end_date + timedelta(days=1), datetime.min.time()) if end_date else None
+
+        query = db.query(Log.id, Log.timestamp, Log.user_id, Log.action_type, Log.item_id, Log.container_id, Log.details)
+        if start:
+            query = query.filter(Log.timestamp >= start)
+        if end:
+            query = query.filter(Log.timestamp < end)
         if itemId:
             query = query.filter(Log.item_id == itemId)
         if userId:
@@ -957,8 +3161,9 @@ def get_logs(
         if actionType:
             query = query.filter(Log.action_type == actionType)
 
-        logs = query.all()
-        return {"logs": logs}
+        logs = list(read_archived_logs(start, end, itemId, userId, actionType))
+        logs.extend(_log_to_dict(row) for row in query.order_by(Log.timestamp, Log.id).all())
+        return fast_json_response(request, dumps_json({"logs": logs}))
 
     except HTTPException:
         raise  # Re-raise HTTPExceptions as-is
@@ -966,6 +3171,645 @@ def get_logs(
         logging.error(f"Error getting logs: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to retrieve logs")
 
+
+# API: Archive Old Logs
+@app.post("/api/logs/archive")
+def archive_old_logs(
+    retentionDays: int = Query(LOG_RETENTION_DAYS, ge=0, example=30),
+    db: Session = Depends(get_db)
+):
+    try:
+        return archive_logs(db, retentionDays)
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error archiving logs: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to archive logs")
+
+
+def _archive_logs_periodically(db: Session):
+    try:
+        archive_logs(db)
+    except HTTPException:
+        pass  # Another worker holds the archive lock
+
+
+@app.on_event("startup")
+def _start_log_archiving():
+    if LOG_ARCHIVE_INTERVAL_HOURS > 0:
+        run_periodically("log-archive", LOG_ARCHIVE_INTERVAL_HOURS * 3600, _archive_logs_periodically)
+
+# Point-in-time state: checkpoints snapshot every item's usageLimit and
+# placement, and the state at any timestamp is rebuilt by replaying only the
+# log entries written after the nearest earlier checkpoint.
+CHECKPOINT_INTERVAL_HOURS = float(os.environ.get("HYPERDOCK_CHECKPOINT_INTERVAL_HOURS", "24"))  # 0 disables
+CHECKPOINT_POLL_SECONDS = 300
+# Retention: the newest CHECKPOINT_KEEP_RECENT are kept, older ones are thinned
+# to one per CHECKPOINT_THIN_DAYS, and the oldest is always kept as the
+# baseline for items created before their creation was logged
+CHECKPOINT_KEEP_RECENT = int(os.environ.get("HYPERDOCK_CHECKPOINT_KEEP_RECENT", "14"))
+CHECKPOINT_THIN_DAYS = int(os.environ.get("HYPERDOCK_CHECKPOINT_THIN_DAYS", "7"))
+
+
+def _empty_item_state(usage_limit: Optional[int] = None) -> dict:
+    return {"usageLimit": usage_limit, "containerId": None, "startCoordinates": None, "endCoordinates": None}
+
+
+def capture_state(db: Session) -> Tuple[dict, int]:
+    """
+    Current item and placement state, plus the id of the newest log entry it
+    reflects. Everything is read inside one explicit read transaction on its
+    own connection, so the snapshot and the log id come from the same
+    committed state (pysqlite does not open a transaction for plain SELECTs).
+    """
+    with db.get_bind().connect() as conn:
+        conn.exec_driver_sql("BEGIN")
+        try:
+            # Archiving only moves rows older than the retention window, so the
+            # partitions never hold a log id newer than this snapshot
+            last_log_id = max(conn.execute(select(func.max(Log.id))).scalar() or 0, _archived_max_log_id())
+            state = {
+                row.itemId: _empty_item_state(row.usageLimit)
+                for row in conn.execute(select(Item.itemId, Item.usageLimit))
+            }
+            placements = conn.execute(
+                select(Item.itemId, Container.containerId, ItemPlacement.start_coordinates, ItemPlacement.end_coordinates)
+                .join(Item, Item.id == ItemPlacement.item_id)
+                .join(Container, Container.id == ItemPlacement.container_id)
+            )
+            for row in placements:
+                entry = state.setdefault(row.itemId, _empty_item_state())
+                entry["containerId"] = row.containerId
+                entry["startCoordinates"] = row.start_coordinates
+                entry["endCoordinates"] = row.end_coordinates
+        finally:
+            conn.rollback()
+    return state, last_log_id
+
+
+def _archived_max_log_id() -> int:
+    if not os.path.isdir(LOG_ARCHIVE_DIR):
+        return 0
+    return max(
+        (
+            _read_log_partition_index(os.path.join(LOG_ARCHIVE_DIR, name))["maxLogId"]
+            for name in os.listdir(LOG_ARCHIVE_DIR)
+            if name.startswith("logs-") and name.endswith(".index.json")
+        ),
+        default=0
+    )
+
+
+def create_checkpoint(db: Session) -> StateCheckpoint:
+    state, last_log_id = capture_state(db)
+    checkpoint = StateCheckpoint(
+        timestamp=datetime.now(),
+        last_log_id=last_log_id,
+        data_version=current_data_version(),
+        item_count=len(state),
+        state=state
+    )
+    db.add(checkpoint)
+    db.commit()
+    logging.info(f"Created state checkpoint {checkpoint.id} with {len(state)} items at log id {last_log_id}")
+    prune_checkpoints(db)
+    return checkpoint
+
+
+def prune_checkpoints(db: Session) -> int:
+    """
+    Apply the checkpoint retention policy and return how many were deleted.
+    Reconstruction only needs some checkpoint at or before the requested time,
+    so thinning old ones makes replays longer but never wrong.
+    """
+    rows = db.execute(
+        select(StateCheckpoint.id, StateCheckpoint.timestamp).order_by(StateCheckpoint.timestamp.desc())
+    ).all()
+    older = rows[max(CHECKPOINT_KEEP_RECENT, 1):]
+    if not older:
+        return 0
+
+    doomed = []
+    kept_at = rows[-1].timestamp  # The oldest checkpoint is the baseline
+    for row in reversed(older[:-1]):
+        if row.timestamp - kept_at >= timedelta(days=CHECKPOINT_THIN_DAYS):
+            kept_at = row.timestamp
+        else:
+            doomed.append(row.id)
+
+    for chunk in _chunked(doomed):
+        db.execute(delete(StateCheckpoint).where(StateCheckpoint.id.in_(chunk)))
+    db.commit()
+    if doomed:
+        logging.info(f"Pruned {len(doomed)} state checkpoints")
+    return len(doomed)
+
+
+def checkpoint_if_due(db: Session) -> Optional[StateCheckpoint]:
+    """
+    Create a checkpoint if the newest one is older than the interval and the
+    data has changed since it was taken.
+    """
+    latest = db.query(StateCheckpoint).order_by(StateCheckpoint.timestamp.desc()).first()
+    if latest:
+        if datetime.now() - latest.timestamp < timedelta(hours=CHECKPOINT_INTERVAL_HOURS):
+            return None
+        last_log_id = max(db.execute(select(func.max(Log.id))).scalar() or 0, _archived_max_log_id())
+        if latest.data_version == current_data_version() and latest.last_log_id == last_log_id:
+            return None
+    return create_checkpoint(db)
+
+
+def _checkpoint_periodically(db: Session):
+    # Every worker polls, but only the one holding the lock checks and writes,
+    # so two workers never create the same checkpoint
+    lock_path = _acquire_lock_file(".checkpoint.lock")
+    if lock_path is None:
+        return
+    try:
+        checkpoint_if_due(db)
+    finally:
+        os.remove(lock_path)
+
+
+@app.on_event("startup")
+def _start_checkpointing():
+    if CHECKPOINT_INTERVAL_HOURS > 0:
+        run_periodically("checkpoint", CHECKPOINT_POLL_SECONDS, _checkpoint_periodically)
+
+
+def apply_log_entry(state: dict, entry: dict):
+    """
+    Apply one log entry (as produced by _log_to_dict) to a state mapping.
+
+    Every write to item or placement state logs one of these actions in the
+    same commit: creation, placement, retrieval, usage (simulated days, with
+    the resulting usageLimit), deletion and disposal.
+    """
+    item_id = entry["itemId"]
+    if not item_id:
+        return
+    action = entry["actionType"]
+    details = entry["details"] or {}
+
+    if action == "creation":
+        state[item_id] = _empty_item_state(details.get("usageLimit"))
+    elif action == "placement":
+        item = state.setdefault(item_id, _empty_item_state())
+        item["containerId"] = entry["containerId"]
+        item["startCoordinates"] = details.get("startCoordinates")
+        item["endCoordinates"] = details.get("endCoordinates")
+    elif action == "retrieval":
+        item = state.get(item_id)
+        if item is None:
+            return
+        if item["usageLimit"]:
+            item["usageLimit"] -= 1
+        item["containerId"] = None
+        item["startCoordinates"] = None
+        item["endCoordinates"] = None
+    elif action == "usage":
+        item = state.get(item_id)
+        if item is not None:
+            item["usageLimit"] = details.get("usageLimit")
+    elif action in ("deletion", "disposal"):
+        state.pop(item_id, None)
+
+
+def reconstruct_state(db: Session, at: datetime) -> dict:
+    """
+    Item and placement state as of `at`, from the nearest checkpoint taken at or
+    before it plus the log entries that followed.
+    """
+    checkpoint = (
+        db.query(StateCheckpoint)
+        .filter(StateCheckpoint.timestamp <= at)
+        .order_by(StateCheckpoint.timestamp.desc())
+        .first()
+    )
+    state = {item_id: dict(entry) for item_id, entry in checkpoint.state.items()} if checkpoint else {}
+    last_log_id = checkpoint.last_log_id if checkpoint else 0
+    # Archive partitions are daily, so start from the checkpoint's day to catch
+    # entries stamped just before it but committed after its snapshot
+    archive_start = datetime.combine(checkpoint.timestamp.date(), datetime.min.time()) if checkpoint else None
+
+    entries = [
+        entry for entry in read_archived_logs(archive_start, at + timedelta(microseconds=1))
+        if entry["id"] > last_log_id
+    ]
+    rows = db.execute(
+        select(Log.id, Log.timestamp, Log.user_id, Log.action_type, Log.item_id, Log.container_id, Log.details)
+        .where(Log.id > last_log_id, Log.timestamp <= at)
+    )
+    entries.extend(_log_to_dict(row) for row in rows)
+    entries.sort(key=lambda entry: (entry["timestamp"], entry["id"]))
+
+    for entry in entries:
+        apply_log_entry(state, entry)
+
+    return {
+        "checkpoint": {"id": checkpoint.id, "timestamp": checkpoint.timestamp.isoformat()} if checkpoint else None,
+        "logsReplayed": len(entries),
+        "state": state
+    }
+
+
+def _summarize_state(state: dict, item_id: Optional[str], container_id: Optional[str]) -> dict:
+    items = []
+    containers = {}
+    for public_id, entry in state.items():
+        if (item_id and public_id != item_id) or (container_id and entry["containerId"] != container_id):
+            continue
+        items.append({"itemId": public_id, **entry})
+        if entry["containerId"] and entry["startCoordinates"] and entry["endCoordinates"]:
+            usage = containers.setdefault(entry["containerId"], {"containerId": entry["containerId"], "itemCount": 0, "usedVolume": 0})
+            usage["itemCount"] += 1
+            usage["usedVolume"] += _box_metrics(entry["startCoordinates"], entry["endCoordinates"])[0]
+    return {"items": items, "containers": list(containers.values())}
+
+
+# API: Create State Checkpoint
+@app.post("/api/history/checkpoint")
+def create_state_checkpoint(db: Session = Depends(get_db)):
+    try:
+        checkpoint = create_checkpoint(db)
+        return {
+            "success": True,
+            "checkpointId": checkpoint.id,
+            "timestamp": checkpoint.timestamp.isoformat(),
+            "itemCount": checkpoint.item_count,
+            "lastLogId": checkpoint.last_log_id
+        }
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error creating state checkpoint: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to create state checkpoint")
+
+
+# API: List State Checkpoints
+@app.get("/api/history/checkpoints")
+def list_state_checkpoints(db: Session = Depends(get_db)):
+    rows = db.execute(
+        select(StateCheckpoint.id, StateCheckpoint.timestamp, StateCheckpoint.item_count, StateCheckpoint.last_log_id)
+        .order_by(StateCheckpoint.timestamp.desc())
+    ).all()
+    return {
+        "checkpoints": [
+            {"id": row.id, "timestamp": row.timestamp.isoformat(), "itemCount": row.item_count, "lastLogId": row.last_log_id}
+            for row in rows
+        ]
+    }
+
+
+# API: Get Historical State
+@app.get("/api/history/state")
+def get_historical_state(
+    request: Request,
+    timestamp: str = Query(..., example="2025-03-15T10:00:00"),
+    itemId: Optional[str] = Query(None, example="item001"),
+    containerId: Optional[str] = Query(None, example="contA"),
+    db: Session = Depends(get_db),
+):
+    try:
+        try:
+            at = datetime.fromisoformat(timestamp)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid timestamp format. Use ISO 8601, e.g. 2025-03-15T10:00:00.")
+        if at.tzinfo:
+            at = at.astimezone().replace(tzinfo=None)  # Log timestamps are naive local time
+
+        reconstructed = reconstruct_state(db, at)
+        return fast_json_response(request, dumps_json({
+            "success": True,
+            "timestamp": at.isoformat(),
+            "checkpoint": reconstructed["checkpoint"],
+            "logsReplayed": reconstructed["logsReplayed"],
+            **_summarize_state(reconstructed["state"], itemId, containerId)
+        }))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error reconstructing state: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to reconstruct historical state")
+
+# Background jobs
+JOB_MAX_CONCURRENCY = int(os.environ.get("HYPERDOCK_JOB_WORKERS", "2"))
+JOB_PROGRESS_INTERVAL = 0.5  # Minimum seconds between progress writes for a job
+
+_job_executor = ThreadPoolExecutor(max_workers=JOB_MAX_CONCURRENCY, thread_name_prefix="hyperdock-job")
+_job_futures = {}
+_job_futures_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised from a job's progress callback once cancellation has been requested."""
+
+
+class JobProgress:
+    """
+    Progress callback handed to job functions as progress(done, total).
+
+    Writes are throttled to JOB_PROGRESS_INTERVAL, and every write doubles as a
+    cancellation checkpoint so a DELETE handled by any worker stops the job.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._last_report = 0.0
+
+    def __call__(self, done: int, total: int):
+        now = time.monotonic()
+        if now - self._last_report < JOB_PROGRESS_INTERVAL:
+            return
+        self._last_report = now
+
+        db = SessionLocal()
+        try:
+            job = db.get(Job, self.job_id)
+            if job.cancel_requested:
+                raise JobCancelled()
+            job.progress = round(done / total, 4) if total else 0.0
+            db.commit()
+        finally:
+            db.close()
+
+
+def _update_job(job_id: str, **fields):
+    db = SessionLocal()
+    try:
+        db.query(Job).filter(Job.id == job_id).update(fields, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _run_job(job_id: str, fn, args: tuple):
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        if job.cancel_requested:
+            job.status = "cancelled"
+            db.commit()
+            return
+        job.status = "running"
+        db.commit()
+
+        result = fn(db, *args, progress=JobProgress(job_id))
+        _update_job(job_id, status="succeeded", progress=1.0, result=jsonable_encoder(result))
+
+    except JobCancelled:
+        db.rollback()
+        _update_job(job_id, status="cancelled")
+    except HTTPException as e:
+        db.rollback()
+        _update_job(job_id, status="failed", error=str(e.detail))
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Job {job_id} failed: {e}", exc_info=True)
+        _update_job(job_id, status="failed", error=str(e))
+    finally:
+        db.close()
+        with _job_futures_lock:
+            _job_futures.pop(job_id, None)
+
+
+def submit_job(kind: str, fn, *args) -> str:
+    """
+    Persist a queued job and schedule fn(db, *args, progress=...) on the bounded job pool.
+
+    Job functions are the same ones the synchronous endpoints call directly;
+    progress defaults to None there.
+    """
+    job_id = uuid.uuid4().hex
+    db = SessionLocal()
+    try:
+        db.add(Job(id=job_id, kind=kind, status="queued", worker_pid=os.getpid()))
+        db.commit()
+    finally:
+        db.close()
+
+    with _job_futures_lock:
+        _job_futures[job_id] = _job_executor.submit(_run_job, job_id, fn, args)
+    return job_id
+
+
+def job_submitted_response(job_id: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content={"success": True, "jobId": job_id, "status": "queued", "statusUrl": f"/api/jobs/{job_id}"}
+    )
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _pid_started_at(pid: int) -> Optional[datetime]:
+    """
+    Start time of a process from /proc (Linux only), or None if unknown.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            # Field 22 is the start time in clock ticks since boot; split after
+            # the parenthesised command name, which may contain spaces
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat", "r") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime "))
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+    return datetime.fromtimestamp(boot_time + start_ticks / os.sysconf("SC_CLK_TCK"))
+
+
+def _job_owner_alive(job: Job) -> bool:
+    # PIDs are reused across restarts (in Docker uvicorn is PID 1 every boot),
+    # so a live PID only counts if it is not this freshly started process and
+    # the process already existed when the job was created
+    if job.worker_pid is None or job.worker_pid == os.getpid() or not _pid_alive(job.worker_pid):
+        return False
+    started_at = _pid_started_at(job.worker_pid)
+    return started_at is None or started_at <= job.created_at
+
+
+def _recover_orphaned_jobs():
+    """
+    Jobs live in the process that accepted them, so any queued or running job
+    whose owner process is gone will never finish. Mark those as failed. Runs
+    at import, before this process has accepted any job.
+    """
+    db = SessionLocal()
+    try:
+        pending = db.query(Job).filter(Job.status.in_(["queued", "running"])).all()
+        for job in pending:
+            if not _job_owner_alive(job):
+                job.status = "failed"
+                job.error = "Job interrupted by a server restart"
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Failed to recover orphaned jobs: {e}", exc_info=True)
+    finally:
+        db.close()
+
+
+_recover_orphaned_jobs()
+
+
+def _job_to_dict(job: Job, include_result: bool = True) -> dict:
+    data = {
+        "jobId": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "error": job.error,
+        "createdAt": job.created_at.isoformat() if job.created_at else None,
+        "updatedAt": job.updated_at.isoformat() if job.updated_at else None
+    }
+    if include_result:
+        data["result"] = job.result
+    return data
+
+
+# API: List Jobs
+@app.get("/api/jobs")
+def list_jobs(
+    status: Optional[str] = Query(None, example="running"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    query = db.query(Job)
+    if status:
+        query = query.filter(Job.status == status)
+    jobs = query.order_by(Job.created_at.desc()).limit(limit).all()
+    return {"success": True, "jobs": [_job_to_dict(job, include_result=False) for job in jobs]}
+
+
+# API: Get Job Status
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found")
+    return {"success": True, "job": _job_to_dict(job)}
+
+
+# API: Download Job Result
+@app.get("/api/jobs/{job_id}/result")
+def get_job_result(job_id: str, db: Session = Depends(get_db)):
+    job = db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status}")
+
+    if job.kind == "export_arrangement":
+        return Response(
+            job.result["csv"],
+            media_type="text/csv",
+            headers={"Content-Disposition": f"attachment;filename={job.result['filename']}"}
+        )
+    return job.result
+
+
+# API: Cancel Job
+@app.delete("/api/jobs/{job_id}")
+def cancel_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found")
+    if job.status not in ("queued", "running"):
+        return {"success": False, "message": f"Job {job_id} is already {job.status}", "status": job.status}
+
+    job.cancel_requested = True
+    db.commit()
+
+    # A job still waiting in this process's queue can be dropped right away;
+    # a running one stops at its next progress checkpoint.
+    with _job_futures_lock:
+        future = _job_futures.get(job_id)
+    if future is not None and future.cancel():
+        job.status = "cancelled"
+        db.commit()
+        with _job_futures_lock:
+            _job_futures.pop(job_id, None)
+
+    return {"success": True, "message": f"Cancellation requested for job {job_id}", "status": job.status}
+
+# API: Request Coalescing Metrics
+@app.get("/api/metrics/coalescing")
+def get_coalescing_metrics():
+    return {"success": True, "dataVersion": current_data_version(), **coalescer.metrics()}
+
+# API: Profiling Settings
+@app.get("/api/admin/profiling")
+def get_profiling_settings():
+    profiles = []
+    if os.path.isdir(PROFILE_DIR):
+        for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+            if name.endswith(".json"):
+                with open(os.path.join(PROFILE_DIR, name), "r", encoding="utf-8") as f:
+                    summary = json.load(f)
+                profiles.append({key: summary[key] for key in ("profileId", "timestamp", "method", "path", "status", "durationMs", "sqlCount")})
+    profiles.sort(key=lambda summary: summary["timestamp"], reverse=True)
+    return {"success": True, "settings": _profiling_settings, "profiles": profiles}
+
+
+@app.post("/api/admin/profiling")
+def update_profiling_settings(req: ProfilingSettingsRequest):
+    if req.profileAll is not None:
+        _profiling_settings["profileAll"] = req.profileAll
+    if req.trackSlowest is not None:
+        _profiling_settings["trackSlowest"] = req.trackSlowest
+    if req.slowestCount is not None:
+        if req.slowestCount < 1:
+            raise HTTPException(status_code=400, detail="slowestCount must be at least 1")
+        with _slowest_lock:
+            _profiling_settings["slowestCount"] = req.slowestCount
+            while len(_slowest_requests) > req.slowestCount:
+                heapq.heappop(_slowest_requests)
+    return {"success": True, "settings": _profiling_settings}
+
+
+# API: Slowest Requests
+@app.get("/api/admin/profiling/slowest")
+def get_slowest_requests():
+    with _slowest_lock:
+        requests = [record for _, _, record in sorted(_slowest_requests, reverse=True)]
+    return {"success": True, "requests": requests}
+
+
+def _profile_path(profile_id: str, suffix: str) -> str:
+    if not profile_id.isalnum():
+        raise HTTPException(status_code=400, detail="Invalid profile ID")
+    path = os.path.join(PROFILE_DIR, profile_id + suffix)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return path
+
+
+# API: Get Profile
+@app.get("/api/admin/profiling/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    with open(_profile_path(profile_id, ".json"), "r", encoding="utf-8") as f:
+        return {"success": True, "profile": json.load(f)}
+
+
+# API: Download Profile Stats
+@app.get("/api/admin/profiling/profiles/{profile_id}/download")
+def download_profile(profile_id: str):
+    return FileResponse(
+        _profile_path(profile_id, ".prof"),
+        media_type="application/octet-stream",
+        filename=f"{profile_id}.prof"
+    )
+
 # ✅ Test Route
 @app.get("/")
 def home():
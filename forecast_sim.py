@@ -0,0 +1,31 @@
+"""
+Monte Carlo kernel for HyperDock's consumption forecast. It lives outside
+app.py so process-pool workers can import it without opening the database,
+registering routes or starting background threads.
+"""
+import numpy as np
+
+
+def simulate_depletion_days(args) -> np.ndarray:
+    """
+    Sample the depletion day of every item for a chunk of trajectories.
+
+    Daily uses are Poisson with the item's rate, so the day on which the
+    cumulative count reaches the remaining uses is ceil(T), where T is the
+    arrival time of the n-th event, T ~ Gamma(n, 1 / rate). Sampling T directly
+    avoids materialising a trajectories x items x days array. Expiry caps the
+    result and horizonDays + 1 means "not depleted within the horizon".
+    """
+    remaining, rates, expiry_days, horizon, num_trajectories, seed = args
+    rng = np.random.default_rng(seed)
+
+    days = np.full((num_trajectories, remaining.size), horizon + 1, dtype=np.int32)
+    consumable = (rates > 0) & (remaining > 0)
+    if consumable.any():
+        arrival = rng.standard_gamma(remaining[consumable], size=(num_trajectories, int(consumable.sum())))
+        arrival /= rates[consumable]
+        days[:, consumable] = np.minimum(np.ceil(arrival), horizon + 1)
+    days[:, remaining <= 0] = 0
+
+    np.minimum(days, expiry_days, out=days)
+    return days.astype(np.int16)
@@ -0,0 +1,212 @@
+"""
+Replay request traces captured by HyperDock's traffic capture middleware
+(HYPERDOCK_CAPTURE_FILE) against a running instance, preserving the recorded
+arrival pattern at a chosen speed-up, and report latency percentiles and
+error rates per route.
+
+    python replay_traffic.py traces.jsonl --base-url http://127.0.0.1:8000 --speed 10 --concurrency 16
+"""
+import argparse
+import json
+import math
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+MIN_SPEED = 1.0
+MAX_SPEED = 50.0
+
+
+def load_traces(path, route_pattern=None, limit=None):
+    traces = []
+    skipped = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            trace = json.loads(line)
+            if route_pattern and not route_pattern.search(trace["route"]):
+                continue
+            # Uploads and oversized bodies were not captured, so they cannot be replayed faithfully
+            if trace.get("bodyOmitted"):
+                skipped += 1
+                continue
+            traces.append(trace)
+    traces.sort(key=lambda trace: trace["ts"])
+    if limit:
+        traces = traces[:limit]
+    return traces, skipped
+
+
+def build_request(base_url, trace):
+    url = base_url.rstrip("/") + trace["path"]
+    if trace.get("query"):
+        url += "?" + urlencode([tuple(pair) for pair in trace["query"]])
+    data = None
+    headers = {}
+    if "body" in trace:
+        data = json.dumps(trace["body"]).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+    if trace.get("acceptEncoding"):
+        headers["Accept-Encoding"] = trace["acceptEncoding"]
+    return urllib.request.Request(url, data=data, headers=headers, method=trace["method"])
+
+
+def send(request, timeout):
+    """
+    Returns (status, latency in ms, error message or None).
+    """
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+        error = None
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+        error = None
+    except Exception as e:
+        status = None
+        error = f"{type(e).__name__}: {e}"
+    return status, (time.perf_counter() - started) * 1000, error
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def record(self, trace, status, latency_ms, lag_ms, error):
+        key = f"{trace['method']} {trace['route']}"
+        with self.lock:
+            stats = self.routes.setdefault(key, {
+                "latencies": [],
+                "lags": [],
+                "errors": 0,
+                "statusMismatches": 0,
+                "failures": {}
+            })
+            stats["latencies"].append(latency_ms)
+            stats["lags"].append(lag_ms)
+            if error is not None or status >= 500:
+                stats["errors"] += 1
+                reason = error or f"HTTP {status}"
+                stats["failures"][reason] = stats["failures"].get(reason, 0) + 1
+            if status != trace.get("status"):
+                stats["statusMismatches"] += 1
+
+    def summary(self):
+        report = {}
+        for key, stats in sorted(self.routes.items()):
+            latencies = sorted(stats["latencies"])
+            lags = sorted(stats["lags"])
+            report[key] = {
+                "requests": len(latencies),
+                "errors": stats["errors"],
+                "errorRate": round(stats["errors"] / len(latencies), 4),
+                "statusMismatches": stats["statusMismatches"],
+                "p50Ms": round(percentile(latencies, 0.50), 2),
+                "p95Ms": round(percentile(latencies, 0.95), 2),
+                "p99Ms": round(percentile(latencies, 0.99), 2),
+                "maxMs": round(latencies[-1], 2),
+                "p95LagMs": round(percentile(lags, 0.95), 2),
+                "failures": stats["failures"]
+            }
+        return report
+
+
+def replay(traces, base_url, speed, concurrency, timeout):
+    """
+    Dispatch each trace at its recorded offset divided by speed. Lag is how
+    late a request started against its schedule; a large lag means the
+    concurrency limit, not the server, is shaping the load.
+    """
+    results = Results()
+    if not traces:
+        return results
+
+    def run(trace, due):
+        lag_ms = max(0.0, (time.perf_counter() - due) * 1000)
+        status, latency_ms, error = send(build_request(base_url, trace), timeout)
+        results.record(trace, status, latency_ms, lag_ms, error)
+
+    first_ts = traces[0]["ts"]
+    started = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for trace in traces:
+            due = started + (trace["ts"] - first_ts) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(run, trace, due))
+    for future in futures:
+        future.result()  # Surface bugs in the harness itself rather than dropping requests
+    return results
+
+
+def print_report(report, elapsed, skipped):
+    total = sum(stats["requests"] for stats in report.values())
+    errors = sum(stats["errors"] for stats in report.values())
+    print(f"Replayed {total} requests in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f} req/s), "
+          f"{errors} errors, {skipped} skipped")
+    header = f"{'route':<48} {'count':>7} {'err%':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'lag95':>9}"
+    print(header)
+    print("-" * len(header))
+    for key, stats in report.items():
+        print(f"{key[:48]:<48} {stats['requests']:>7} {stats['errorRate'] * 100:>5.1f}% "
+              f"{stats['p50Ms']:>9.2f} {stats['p95Ms']:>9.2f} {stats['p99Ms']:>9.2f} "
+              f"{stats['maxMs']:>9.2f} {stats['p95LagMs']:>9.2f}")
+    for key, stats in report.items():
+        for reason, occurrences in stats["failures"].items():
+            print(f"  {key}: {occurrences} x {reason}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay captured HyperDock traffic and report per-route latency.")
+    parser.add_argument("capture_file", help="JSONL file written by the traffic capture middleware")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help=f"Replay speed-up, {MIN_SPEED:g} to {MAX_SPEED:g}")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum requests in flight")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--route", help="Only replay routes matching this regular expression")
+    parser.add_argument("--limit", type=int, help="Replay at most this many requests")
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    if not MIN_SPEED <= args.speed <= MAX_SPEED:
+        parser.error(f"--speed must be between {MIN_SPEED:g} and {MAX_SPEED:g}")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    traces, skipped = load_traces(args.capture_file, re.compile(args.route) if args.route else None, args.limit)
+    if not traces:
+        print("No replayable traces found", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    report = replay(traces, args.base_url, args.speed, args.concurrency, args.timeout).summary()
+    print_report(report, time.perf_counter() - started, skipped)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"speed": args.speed, "concurrency": args.concurrency, "skipped": skipped, "routes": report}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,23 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    # app.py opens ./test.db on import (and on every new connection), so the
+    # whole session runs from one scratch directory
+    workdir = tmp_path_factory.mktemp("hyperdock")
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    os.environ["HYPERDOCK_LOG_ARCHIVE_DIR"] = str(workdir / "log_archive")
+    sys.path.insert(0, REPO_ROOT)
+    try:
+        yield importlib.import_module("app")
+    finally:
+        sys.path.remove(REPO_ROOT)
+        os.chdir(previous_cwd)
@@ -0,0 +1,77 @@
+import pytest
+
+
+@pytest.fixture
+def db(app_module):
+    session = app_module.SessionLocal()
+    for model in (app_module.Log, app_module.ItemPlacement, app_module.ContainerUsage, app_module.Item, app_module.Container):
+        session.query(model).delete()
+    session.add(app_module.Container(containerId="c1", zone="Z", width=100, depth=100, height=100))
+    session.add_all([
+        app_module.Item(itemId=f"i{n}", name=f"item {n}", width=10, depth=10, height=10, mass=1.0,
+                        priority=1, usageLimit=3, preferredZone="Z")
+        for n in range(3)
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def entry(item_id, width):
+    return {
+        "itemId": item_id,
+        "containerId": "c1",
+        "position": {
+            "startCoordinates": {"width": width, "depth": 0, "height": 0},
+            "endCoordinates": {"width": width + 10, "depth": 10, "height": 10}
+        }
+    }
+
+
+def placement_widths(app_module, db):
+    rows = db.query(app_module.Item.itemId, app_module.ItemPlacement.start_coordinates).join(
+        app_module.ItemPlacement, app_module.ItemPlacement.item_id == app_module.Item.id
+    )
+    return {item_id: start["width"] for item_id, start in rows}
+
+
+def item_count(app_module, db):
+    return db.query(app_module.ContainerUsage.item_count).scalar()
+
+
+def test_rejected_move_keeps_existing_placement(app_module, db):
+    assert all(r["success"] for r in app_module.bulk_place(db, [entry("i0", 0), entry("i1", 20)]))
+    logs_before = db.query(app_module.Log).count()
+
+    results = app_module.bulk_place(db, [entry("i2", 60), entry("i1", 5)])
+
+    assert results[0]["success"] is True
+    assert results[1] == {"itemId": "i1", "success": False, "message": "Overlaps with item i0"}
+    assert placement_widths(app_module, db) == {"i0": 0, "i1": 20, "i2": 60}
+    assert item_count(app_module, db) == 3
+    assert db.query(app_module.Log).count() == logs_before + 1
+
+
+def test_rejected_mover_still_blocks_its_current_box(app_module, db):
+    app_module.bulk_place(db, [entry("i0", 0), entry("i1", 20)])
+
+    # i2 targets i1's spot, which only frees up if i1's move to 5 succeeds; it does not
+    results = app_module.bulk_place(db, [entry("i2", 20), entry("i1", 5)])
+
+    assert results[0] == {"itemId": "i2", "success": False, "message": "Overlaps with item i1"}
+    assert results[1]["success"] is False
+    assert placement_widths(app_module, db) == {"i0": 0, "i1": 20}
+    assert item_count(app_module, db) == 2
+
+
+def test_rejected_mover_blocks_space_when_all_occupants_move(app_module, db):
+    app_module.bulk_place(db, [entry("i0", 0), entry("i1", 20)])
+
+    # Every item already in c1 is in the batch, so nothing there is fixed
+    results = app_module.bulk_place(db, [entry("i0", 0), entry("i2", 20), entry("i1", 5)])
+
+    assert results[0]["success"] is True
+    assert results[1] == {"itemId": "i2", "success": False, "message": "Overlaps with item i1"}
+    assert results[2] == {"itemId": "i1", "success": False, "message": "Overlaps with item i0"}
+    assert placement_widths(app_module, db) == {"i0": 0, "i1": 20}
+    assert item_count(app_module, db) == 2
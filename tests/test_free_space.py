@@ -0,0 +1,160 @@
+import random
+from itertools import combinations
+
+import pytest
+
+
+def overlaps(a, b):
+    return all(a[axis] < b[axis + 3] and b[axis] < a[axis + 3] for axis in range(3))
+
+
+def brute_force_maximal(size, boxes):
+    """
+    Every empty cuboid with faces on box or container planes that cannot be
+    grown past any face, found by exhaustive enumeration.
+    """
+    coords = [sorted({0, size[axis]} | {b[axis] for b in boxes} | {b[axis + 3] for b in boxes}) for axis in range(3)]
+
+    def empty(cuboid):
+        return not any(overlaps(cuboid, box) for box in boxes)
+
+    def grown(cuboid, axis, low):
+        values = coords[axis]
+        grown = list(cuboid)
+        if low:
+            position = values.index(cuboid[axis])
+            if position == 0:
+                return None
+            grown[axis] = values[position - 1]
+        else:
+            position = values.index(cuboid[axis + 3])
+            if position == len(values) - 1:
+                return None
+            grown[axis + 3] = values[position + 1]
+        return tuple(grown)
+
+    maximal = set()
+    for x1, x2 in combinations(coords[0], 2):
+        for y1, y2 in combinations(coords[1], 2):
+            for z1, z2 in combinations(coords[2], 2):
+                cuboid = (x1, y1, z1, x2, y2, z2)
+                if not empty(cuboid):
+                    continue
+                if all(
+                    bigger is None or not empty(bigger)
+                    for bigger in (grown(cuboid, axis, low) for axis in range(3) for low in (True, False))
+                ):
+                    maximal.add(cuboid)
+    return maximal
+
+
+def random_boxes(rng, size, count):
+    boxes = []
+    while len(boxes) < count:
+        box = []
+        for axis in range(3):
+            start = rng.randrange(size[axis])
+            box.append(start)
+        for axis in range(3):
+            box.append(rng.randint(box[axis] + 1, size[axis]))
+        box = tuple(box)
+        if not any(overlaps(box, other) for other in boxes):
+            boxes.append(box)
+    return boxes
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_carve_matches_brute_force(app_module, seed):
+    rng = random.Random(seed)
+    size = tuple(rng.randint(4, 40) for _ in range(3))
+    boxes = random_boxes(rng, size, rng.randint(1, 5))
+
+    space = app_module._ContainerSpace("c", "Z", *size)
+    for box in boxes:
+        space.carve(box)
+
+    cuboids = list(space.cuboids.values())
+    assert len(cuboids) == len(set(cuboids))
+    assert set(cuboids) == brute_force_maximal(size, boxes)
+
+
+@pytest.fixture
+def db(app_module):
+    session = app_module.SessionLocal()
+    for model in (app_module.Log, app_module.ItemPlacement, app_module.ContainerUsage, app_module.Item, app_module.Container):
+        session.query(model).delete()
+    session.add(app_module.Container(containerId="c1", zone="Z", width=10, depth=10, height=10))
+    session.add_all([
+        app_module.Item(itemId=f"i{n}", name=f"item {n}", width=5, depth=10, height=10, mass=1.0,
+                        priority=1, usageLimit=3, preferredZone="Z")
+        for n in range(2)
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def place(app_module, db, item_id, x):
+    start, end = {"width": x, "depth": 0, "height": 0}, {"width": x + 5, "depth": 10, "height": 10}
+    item = db.query(app_module.Item).filter(app_module.Item.itemId == item_id).one()
+    container = db.query(app_module.Container).one()
+    db.add(app_module.ItemPlacement(item_id=item.id, container_id=container.id, start_coordinates=start, end_coordinates=end))
+    db.commit()
+    return container.id, start, end
+
+
+def free_cuboids(index, db):
+    (space,) = index._current_spaces(db)
+    return set(space.cuboids.values())
+
+
+def test_dirty_container_is_rebuilt_from_placements(app_module, db):
+    index = app_module.FreeSpaceIndex()
+    container_pk, start, end = place(app_module, db, "i0", 0)
+    assert free_cuboids(index, db) == {(5, 0, 0, 10, 10, 10)}
+
+    db.query(app_module.ItemPlacement).delete()
+    db.commit()
+    index.mark_dirty(container_pk)
+
+    assert free_cuboids(index, db) == {(0, 0, 0, 10, 10, 10)}
+    assert not index._dirty
+
+
+def test_change_during_rebuild_keeps_container_dirty(app_module, db):
+    index = app_module.FreeSpaceIndex()
+    container_pk, _, _ = place(app_module, db, "i0", 0)
+    free_cuboids(index, db)
+    index.mark_dirty(container_pk)
+
+    load = index._load
+
+    def racing_load(db, container_pks=None):
+        spaces = load(db, container_pks)
+        # Another request places i1 after this rebuild read the placements
+        _, start, end = place(app_module, db, "i1", 5)
+        index.add_placement(container_pk, start, end)
+        return spaces
+
+    index._load = racing_load
+    assert free_cuboids(index, db) == {(5, 0, 0, 10, 10, 10)}  # This query sees the stale build
+    assert container_pk in index._dirty
+
+    index._load = load
+    assert free_cuboids(index, db) == set()
+    assert not index._dirty
+
+
+def test_invalidate_during_full_load_discards_it(app_module, db):
+    index = app_module.FreeSpaceIndex()
+    place(app_module, db, "i0", 0)
+    load = index._load
+
+    def racing_load(db, container_pks=None):
+        spaces = load(db, container_pks)
+        index.invalidate()
+        return spaces
+
+    index._load = racing_load
+    assert free_cuboids(index, db) == {(5, 0, 0, 10, 10, 10)}
+    assert index._containers is None